@@ -0,0 +1,49 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Возвращает общий для процесса пул фоновых потоков."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_JOBS_WORKERS,
+                    thread_name_prefix='yatube-jobs',
+                )
+    return _executor
+
+
+def run_job(func, *args, **kwargs) -> None:
+    """Выполняет задачу и закрывает соединение с базой своего потока."""
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        connection.close()
+
+
+def enqueue(func, *args, **kwargs) -> None:
+    """Ставит задачу в фоновую очередь процесса.
+
+    Задача стартует только после фиксации текущей транзакции, чтобы
+    увидеть сохранённые данные. При BACKGROUND_JOBS_EAGER задача
+    выполняется сразу в текущем потоке — так удобнее в тестах.
+    """
+    if settings.BACKGROUND_JOBS_EAGER:
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_job, func, *args, **kwargs)
+    )
@@ -0,0 +1,206 @@
+import math
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+
+CSRF_ALPHABET = string.ascii_letters + string.digits
+
+
+class Request(NamedTuple):
+    """Запрос виртуального пользователя к одному адресу сайта."""
+    name: str
+    method: str
+    path: str
+    data: Optional[Dict] = None
+
+
+class Visitor:
+    """Виртуальный пользователь: свои cookie сессии и CSRF."""
+
+    def __init__(self, session_key: Optional[str] = None):
+        self.session_key = session_key
+        # Несолёный секрет из 32 символов Django принимает и в cookie,
+        # и в поле формы, поэтому POST проходит CsrfViewMiddleware.
+        self.csrf_token = ''.join(
+            random.choices(CSRF_ALPHABET, k=32)
+        )
+
+    @property
+    def logged_in(self) -> bool:
+        return self.session_key is not None
+
+    def cookie(self) -> str:
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_token}
+        if self.session_key:
+            cookies[settings.SESSION_COOKIE_NAME] = self.session_key
+        return '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+
+def make_environ(request: Request, visitor: Visitor) -> Dict:
+    """WSGI-окружение запроса, как его собирает сервер приложений."""
+    path, _, query = request.path.partition('?')
+    body = b''
+    if request.method == 'POST':
+        body = urlencode({
+            **(request.data or {}),
+            'csrfmiddlewaretoken': visitor.csrf_token,
+        }).encode()
+    return {
+        'REQUEST_METHOD': request.method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': visitor.cookie(),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+class Sample(NamedTuple):
+    name: str
+    status: int
+    seconds: float
+    queries: int
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Процентиль по ближайшему рангу; values уже отсортированы."""
+    if not values:
+        return 0.0
+    # Умножение до деления: 95 * 100 / 100 ровно 95, без ошибки
+    # округления, которая сдвинула бы ceil на следующий ранг.
+    rank = max(math.ceil(percent * len(values) / 100) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict:
+    """Пропускная способность, задержки и SQL по каждому адресу."""
+    by_name: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_name.setdefault(sample.name, []).append(sample)
+    by_name['*'] = samples
+    results = {}
+    for name, group in sorted(by_name.items()):
+        latencies = sorted(sample.seconds * 1000 for sample in group)
+        results[name] = {
+            'requests': len(group),
+            'errors': sum(sample.status >= 500 for sample in group),
+            'statuses': {
+                str(status): sum(s.status == status for s in group)
+                for status in sorted({s.status for s in group})
+            },
+            'rps': round(len(group) / duration, 2) if duration else 0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0,
+            'queries': round(
+                sum(sample.queries for sample in group) / len(group), 2
+            ) if group else 0,
+        }
+    return results
+
+
+class LoadTest:
+    """Гоняет WSGI-приложение в пуле потоков по смеси запросов.
+
+    Каждый поток — виртуальный пользователь: он вызывает next_request
+    и отправляет запрос прямо в application, без сети, считая время
+    ответа и SQL-запросы своего соединения с базой.
+    """
+
+    def __init__(self, application: Callable,
+                 visitors: List[Visitor],
+                 next_request: Callable[[random.Random, Visitor], Request],
+                 seed: int = 0):
+        self.application = application
+        self.visitors = visitors
+        self.next_request = next_request
+        self.seed = seed
+        self.samples: List[Sample] = []
+        self._lock = threading.Lock()
+
+    def call(self, request: Request, visitor: Visitor) -> Sample:
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = self.application(make_environ(request, visitor),
+                                        start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        return Sample(
+            request.name, status[0], time.perf_counter() - started, queries,
+        )
+
+    def worker(self, number: int, deadline: float, warmup_until: float,
+               requests: Optional[int]) -> None:
+        rng = random.Random(f'{self.seed}:{number}')
+        visitor = self.visitors[number % len(self.visitors)]
+        samples = []
+        sent = 0
+        try:
+            while time.monotonic() < deadline and (
+                requests is None or sent < requests
+            ):
+                request = self.next_request(rng, visitor)
+                sample = self.call(request, visitor)
+                if time.monotonic() >= warmup_until:
+                    samples.append(sample)
+                    sent += 1
+        finally:
+            connection.close()
+        with self._lock:
+            self.samples.extend(samples)
+
+    def run(self, concurrency: int, duration: float, warmup: float = 0,
+            requests_per_worker: Optional[int] = None) -> Dict:
+        started = time.monotonic()
+        warmup_until = started + warmup
+        deadline = warmup_until + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(
+                    self.worker, number, deadline, warmup_until,
+                    requests_per_worker,
+                )
+                for number in range(concurrency)
+            ]
+            for future in futures:
+                future.result()
+        measured = time.monotonic() - max(warmup_until, started)
+        return summarize(self.samples, measured)
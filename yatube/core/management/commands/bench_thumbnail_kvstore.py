@@ -0,0 +1,94 @@
+import os
+import tempfile
+import time
+from random import Random
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.thumbnail_kvstore import KVStore
+
+
+class PrivateCacheKVStore(CachedDBKVStore):
+    """Стандартное хранилище sorl со своим LocMemCache, как у воркера."""
+
+    def __init__(self):
+        super().__init__()
+        self._cache = LocMemCache('bench-thumbnail-kvstore', {})
+
+    @property
+    def cache(self):
+        return self._cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск миниатюр на страницу в стандартном хранилище '
+        'sorl (cached_db) и в core.thumbnail_kvstore.KVStore.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=2000)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--pages', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, name, get_raw, pages):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for page in pages:
+                for key in page:
+                    get_raw(key)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name:<32} {elapsed / len(pages) * 1e6:10.1f} мкс/стр. '
+            f'{len(queries) / len(pages):8.2f} SQL/стр.'
+        )
+
+    def handle(self, *args, **options):
+        random = Random(options['seed'])
+        keys = [
+            add_prefix(f'bench-{i:08d}') for i in range(options['images'])
+        ]
+        value = '{"name": "cache/00/00/bench.jpg", "size": [960, 339]}'
+        pages = [
+            random.sample(keys, options['per_page'])
+            for _ in range(options['pages'])
+        ]
+        self.stdout.write(
+            f'Картинок: {len(keys)}, страниц: {len(pages)}, '
+            f'миниатюр на странице: {options["per_page"]}'
+        )
+
+        with transaction.atomic():
+            KVStoreModel.objects.bulk_create(
+                KVStoreModel(key=key, value=value) for key in keys
+            )
+            store = PrivateCacheKVStore()
+            self.measure('cached_db, холодный воркер', store._get_raw, pages)
+            self.measure('cached_db, прогретый воркер', store._get_raw, pages)
+            transaction.set_rollback(True)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'kvstore.sqlite3')
+            KVStore(path).set_many_raw((key, value) for key in keys)
+
+            store = KVStore(path)
+            self.measure('sqlite+LRU, холодный воркер', store._get_raw, pages)
+            self.measure('sqlite+LRU, прогретый воркер', store._get_raw, pages)
+
+            store = KVStore(path)
+            started = time.perf_counter()
+            loaded = store.warm()
+            self.stdout.write(
+                f'Прогрев при старте: {loaded} ключей за '
+                f'{(time.perf_counter() - started) * 1e3:.1f} мс'
+            )
+            self.measure('sqlite+LRU, после прогрева', store._get_raw, pages)
@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (%s, %s, ...) разной длины — один и тот же запрос.
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+# Служебные команды транзакций повторяются законно.
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+RENDER_ANNOTATED = Node.render_annotated.__code__
+THIS_FILE = os.path.abspath(__file__)
+
+
+class NPlusOneError(AssertionError):
+    """Один и тот же запрос выполнен в цикле — N+1."""
+
+
+@lru_cache(maxsize=1024)
+def query_shape(sql: str) -> str:
+    """SQL без различий в параметрах: так выглядит каждый шаг N+1."""
+    return PLACEHOLDERS.sub('%s', sql)
+
+
+def query_location() -> Dict[str, Optional[str]]:
+    """Строка шаблона и строка кода проекта, откуда пришёл запрос."""
+    template = code = None
+    base_dir = os.path.abspath(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        if template is None and frame.f_code is RENDER_ANNOTATED:
+            node = frame.f_locals['self']
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                template = f'{name}:{token.lineno}'
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (code is None and filename.startswith(base_dir)
+                and filename != THIS_FILE):
+            code = (
+                f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno}'
+            )
+        frame = frame.f_back
+    return {'template': template, 'code': code}
+
+
+class Repeat:
+    """Запрос, повторённый за один HTTP-запрос, и место первого повтора."""
+
+    def __init__(self, shape: str, location: Dict[str, Optional[str]]):
+        self.shape = shape
+        self.location = location
+        self.count = 0
+
+    def __str__(self):
+        where = ', '.join(
+            f'{name} {place}' for name, place in self.location.items()
+            if place
+        ) or 'место неизвестно'
+        return f'{self.count} раз ({where}): {self.shape}'
+
+
+class QueryShapes:
+    """Считает запросы по форме и запоминает те, что повторяются.
+
+    Место (шаблон и код) ищется по стеку только когда форма набирает
+    NPLUSONE_THRESHOLD повторов, так что обычные запросы стоят одного
+    обращения к словарю.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.counts: Dict[str, int] = {}
+        self.repeats: Dict[str, Repeat] = {}
+
+    def execute(self, execute, sql, params, many, context):
+        if not sql.startswith(IGNORED_PREFIXES):
+            shape = query_shape(sql)
+            count = self.counts[shape] = self.counts.get(shape, 0) + 1
+            if count == self.threshold:
+                self.repeats[shape] = Repeat(shape, query_location())
+            if count >= self.threshold:
+                self.repeats[shape].count = count
+        return execute(sql, params, many, context)
+
+    @property
+    def problems(self) -> List[Repeat]:
+        return list(self.repeats.values())
+
+
+@contextmanager
+def record_query_shapes(threshold: int = None):
+    """Собирает формы всех запросов текущего потока внутри блока."""
+    shapes = QueryShapes(threshold or settings.NPLUSONE_THRESHOLD)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(shapes.execute))
+        yield shapes
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 в каждом запросе.
+
+    При NPLUSONE_RAISE (в тестах) повтор превращается в NPlusOneError,
+    иначе в предупреждение логгера core.nplusone с адресом, view,
+    строкой шаблона и кода.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_query_shapes() as shapes:
+            response = self.get_response(request)
+        problems = shapes.problems
+        if not problems:
+            return response
+        match = request.resolver_match
+        view = match.view_name if match else None
+        if settings.NPLUSONE_RAISE:
+            raise NPlusOneError(
+                f'N+1 в {request.method} {request.path} ({view}):\n'
+                + '\n'.join(str(problem) for problem in problems)
+            )
+        for problem in problems:
+            logger.warning(
+                'N+1 в %s %s (%s): %s', request.method, request.path,
+                view, problem,
+            )
+        return response
@@ -0,0 +1,273 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from uuid import uuid4
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+LOCK_SUFFIX = ':lock'
+
+_missing = object()
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех воркеров на машине.
+
+    Файл работает в режиме WAL: читатели не блокируют писателя, а
+    запись одного процесса сразу видна остальным. Когда записей
+    больше MAX_ENTRIES, вытесняется 1/CULL_FREQUENCY давно не
+    читанных ключей. Время последнего чтения обновляется не чаще
+    раза в OPTIONS['TOUCH_INTERVAL'] секунд, чтобы чтения почти не
+    превращались в записи.
+
+    get_or_set() с вычисляемым значением пересчитывает истёкший ключ
+    только в одном воркере: остальные ждут его результата под
+    блокировкой lock().
+    """
+
+    def __init__(self, location: str, params: dict):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.touch_interval = options.get('TOUCH_INTERVAL', 10)
+        self.cull_every = options.get('CULL_EVERY', 100)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self.lock_poll_interval = options.get('LOCK_POLL_INTERVAL', 0.05)
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'connection', None)
+        # Соединение, унаследованное от родителя через fork, не
+        # используется: у дочернего процесса оно должно быть своё.
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self.connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _expires(self, timeout) -> Optional[float]:
+        """Момент истечения: BaseCache отдаёт его как отметку времени."""
+        return self.get_backend_timeout(timeout)
+
+    def _key(self, key, version=None) -> str:
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _read(self, keys):
+        """Живые значения по готовым ключам; обновляет время чтения."""
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection.execute(
+            'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, now),
+        ).fetchall()
+        stale = [
+            (now, key) for key, _, accessed in rows
+            if now - accessed > self.touch_interval
+        ]
+        if stale:
+            self.connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        return {key: pickle.loads(value) for key, value, _ in rows}
+
+    def _write(self, conn, key: str, value, timeout) -> None:
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (
+                key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self._expires(timeout),
+                time.time(),
+            ),
+        )
+
+    def _maybe_cull(self) -> None:
+        self._writes += 1
+        if self._writes % self.cull_every:
+            return
+        self.cull()
+
+    def cull(self) -> None:
+        """Удаляет истёкшие ключи и давно не читанные сверх лимита."""
+        with self._transaction() as conn:
+            conn.execute(
+                'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+                (time.time(),),
+            )
+            count = conn.execute('SELECT count(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (count // self._cull_frequency or 1,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        return {
+            keys[key]: value for key, value in self._read(list(keys)).items()
+        }
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version) is not _missing
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(self.connection, self._key(key, version), value, timeout)
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as conn:
+            for key, value in data.items():
+                self._write(conn, self._key(key, version), value, timeout)
+        self._maybe_cull()
+        return []
+
+    def _add_raw(self, key: str, value, expires: Optional[float]) -> bool:
+        """Записывает ключ, только если его нет или он истёк."""
+        now = time.time()
+        cursor = self.connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (
+                key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+                now,
+                now,
+            ),
+        )
+        return cursor.rowcount == 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._add_raw(
+            self._key(key, version), value, self._expires(timeout)
+        )
+        if added:
+            self._maybe_cull()
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), self._key(key, version), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            conn.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.connection.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        self.connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    @contextmanager
+    def lock(self, key, version=None, timeout: Optional[float] = None):
+        """Межпроцессная блокировка на ключ кэша.
+
+        Блокировка — запись с ограниченным временем жизни, поэтому
+        упавший воркер не держит её дольше LOCK_TIMEOUT. Внутри блока
+        доступен флаг: True, если блокировку удалось взять, и False,
+        если время ожидания вышло.
+        """
+        lock_key = self.make_key(key, version=version) + LOCK_SUFFIX
+        timeout = self.lock_timeout if timeout is None else timeout
+        token = uuid4().hex
+        deadline = time.monotonic() + timeout
+        acquired = self._add_raw(lock_key, token, time.time() + timeout)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            acquired = self._add_raw(lock_key, token, time.time() + timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.connection.execute(
+                    'DELETE FROM cache WHERE key = ? AND value = ?',
+                    (lock_key, pickle.dumps(token, pickle.HIGHEST_PROTOCOL)),
+                )
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, _missing, version)
+        if value is not _missing:
+            return value
+        if not callable(default):
+            return super().get_or_set(key, default, timeout, version)
+        with self.lock(key, version=version):
+            # Пока ждали блокировку, значение мог посчитать другой воркер.
+            value = self.get(key, _missing, version)
+            if value is _missing:
+                value = default()
+                if value is not None:
+                    self.set(key, value, timeout, version)
+        return value
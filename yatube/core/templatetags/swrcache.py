@@ -0,0 +1,135 @@
+import random
+import time
+from contextlib import nullcontext
+from hashlib import md5
+from urllib.parse import quote
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from core.jobs import enqueue
+
+register = template.Library()
+
+KEY_TEMPLATE = 'template.swrcache.{name}.{vary}'
+REFRESH_SUFFIX = ':refresh'
+
+
+def make_fragment_key(fragment_name: str, vary_on) -> str:
+    vary = md5(
+        ':'.join(quote(str(var)) for var in vary_on).encode()
+    ).hexdigest()
+    return KEY_TEMPLATE.format(name=fragment_name, vary=vary)
+
+
+def detach(context: template.Context) -> template.Context:
+    """Новый контекст с теми же значениями, не связанный с исходным.
+
+    copy() делит с исходным контекстом словари переменных и состояние
+    рендера, которые поток запроса продолжает менять.
+    """
+    detached = template.Context(
+        context.flatten(),
+        autoescape=context.autoescape,
+        use_l10n=context.use_l10n,
+        use_tz=context.use_tz,
+    )
+    detached.template = context.template
+    detached.template_name = context.template_name
+    return detached
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, soft_ttl, hard_ttl, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def resolve_ttl(self, expression, context) -> int:
+        value = expression.resolve(context)
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'"swrcache" tag got a non-integer timeout value: {value!r}'
+            )
+
+    def render_and_store(self, context, key, soft_ttl, hard_ttl) -> str:
+        content = self.nodelist.render(context)
+        # Разброс мягкого срока, чтобы фрагменты, записанные
+        # одновременно, не устаревали тоже одновременно.
+        jitter = random.uniform(0, settings.SWRCACHE_JITTER)
+        fresh_until = time.time() + soft_ttl * (1 - jitter)
+        cache.set(key, (content, fresh_until), hard_ttl)
+        return content
+
+    def refresh(self, context, key, soft_ttl, hard_ttl) -> str:
+        try:
+            return self.render_and_store(context, key, soft_ttl, hard_ttl)
+        finally:
+            cache.delete(key + REFRESH_SUFFIX)
+
+    def render(self, context):
+        soft_ttl = self.resolve_ttl(self.soft_ttl, context)
+        hard_ttl = self.resolve_ttl(self.hard_ttl, context)
+        key = make_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        entry = cache.get(key)
+        if entry is not None:
+            content, fresh_until = entry
+            # Устаревший фрагмент обновляет только тот запрос, который
+            # первым взял аренду; остальные отдают старую версию.
+            if time.time() >= fresh_until and cache.add(
+                key + REFRESH_SUFFIX, True, settings.SWRCACHE_REFRESH_LEASE
+            ):
+                if not settings.SWRCACHE_BACKGROUND:
+                    return self.refresh(context, key, soft_ttl, hard_ttl)
+                # Фоновый рендер получает отдельный контекст: этот
+                # запрос продолжает рендерить страницу со своим.
+                enqueue(
+                    self.refresh, detach(context), key, soft_ttl, hard_ttl
+                )
+            return content
+        lock = getattr(cache, 'lock', None)
+        with lock(key) if lock is not None else nullcontext():
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+            return self.render_and_store(context, key, soft_ttl, hard_ttl)
+
+
+@register.tag('swrcache')
+def do_swrcache(parser, token):
+    """Кэширует фрагмент шаблона по схеме stale-while-revalidate.
+
+    Использование::
+
+        {% load swrcache %}
+        {% swrcache [soft_ttl] [hard_ttl] [fragment_name] [var1] ... %}
+            .. фрагмент ..
+        {% endswrcache %}
+
+    До soft_ttl секунд фрагмент отдаётся из кэша как свежий. После
+    этого и до hard_ttl он всё ещё отдаётся сразу, а обновляет его
+    один запрос: в фоновой задаче (SWRCACHE_BACKGROUND), а без неё —
+    сам, отрендерив фрагмент заново. После hard_ttl фрагмент рендерится
+    заново, как в {% cache %}.
+    """
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 4:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 3 arguments."
+        )
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        parser.compile_filter(tokens[2]),
+        tokens[3],
+        [parser.compile_filter(token) for token in tokens[4:]],
+    )
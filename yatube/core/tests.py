@@ -1,4 +1,25 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import path
+
+from posts.models import Post, User
+
+from . import timing
+from .loadtest import percentile
+from .nplusone import NPlusOneError, record_query_shapes
+from .sqlite_cache import SQLiteCache
+from .thumbnail_kvstore import KVStore
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +27,294 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ThumbnailKVStoreTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'kvstore.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_values_are_shared_through_file(self):
+        """Значение, записанное одним воркером, видно другому."""
+        KVStore(self.path)._set_raw('thumb||image||key', 'value')
+        self.assertEqual(
+            KVStore(self.path)._get_raw('thumb||image||key'), 'value'
+        )
+        self.assertIsNone(KVStore(self.path)._get_raw('thumb||image||none'))
+
+    def test_lru_is_bounded(self):
+        """В памяти хранится не больше lru_size ключей."""
+        store = KVStore(self.path, lru_size=2)
+        for i in range(5):
+            store._set_raw(f'key{i}', f'value{i}')
+        self.assertEqual(len(store.lru), 2)
+        self.assertEqual(store._get_raw('key0'), 'value0')
+
+    def test_tests_do_not_use_shared_file(self):
+        """Тесты не очищают файл хранилища разработчика или сервера."""
+        from sorl.thumbnail import default
+
+        self.assertEqual(settings.THUMBNAIL_KVSTORE_PATH, ':memory:')
+        self.assertEqual(default.kvstore.path, ':memory:')
+
+    def test_warm_and_find_keys(self):
+        """Прогрев загружает ключи, поиск по префиксу их находит."""
+        KVStore(self.path).set_many_raw(
+            (f'thumb||image||{i}', 'value') for i in range(3)
+        )
+        store = KVStore(self.path)
+        self.assertEqual(store.warm(), 3)
+        self.assertEqual(len(store.lru), 3)
+        self.assertEqual(len(store._find_keys_raw('thumb||image||')), 3)
+        store._delete_raw('thumb||image||0')
+        self.assertIsNone(KVStore(self.path)._get_raw('thumb||image||0'))
+
+    def test_forked_worker_reconnects(self):
+        """Воркер после fork не пользуется соединением родителя."""
+        store = KVStore(self.path)
+        parent = store.connection
+        self.assertIs(store.connection, parent)
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(store.connection, parent)
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_values_are_shared_through_file(self):
+        """Запись одного воркера видна другому, истёкшие ключи — нет."""
+        self.make_cache().set('key', {'value': 1})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.set('expired', 'value', timeout=0)
+        self.assertIsNone(self.make_cache().get('expired'))
+        self.assertTrue(other.add('expired', 'new'))
+        self.assertFalse(other.add('key', 'new'))
+        other.set('counter', 1)
+        self.assertEqual(self.make_cache().incr('counter'), 2)
+        self.assertEqual(other.get('counter'), 2)
+
+    def test_least_recently_used_keys_culled(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные ключи."""
+        cache = self.make_cache(
+            MAX_ENTRIES=4, CULL_FREQUENCY=2, CULL_EVERY=1, TOUCH_INTERVAL=0,
+        )
+        for i in range(4):
+            cache.set(f'key{i}', i)
+            time.sleep(0.01)
+        cache.get('key0')
+        cache.set('key4', 4)
+        self.assertEqual(
+            sorted(cache.get_many([f'key{i}' for i in range(5)])),
+            ['key0', 'key3', 'key4'],
+        )
+
+    def test_get_or_set_computes_once(self):
+        """Истёкший ключ пересчитывает только один из конкурентов."""
+        cache = self.make_cache(LOCK_POLL_INTERVAL=0.01)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    cache.get_or_set('slow', compute)
+                )
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 4)
+
+
+@override_settings(SWRCACHE_JITTER=0)
+class SWRCacheTagTests(TestCase):
+    TEMPLATE = Template(
+        '{% load swrcache %}'
+        '{% swrcache 60 600 fragment key %}{{ counter }}{% endswrcache %}'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+
+    def counter(self):
+        self.renders += 1
+        return self.renders
+
+    def render_at(self, moment):
+        with mock.patch('core.templatetags.swrcache.time.time',
+                        return_value=moment):
+            return self.TEMPLATE.render(
+                Context({'counter': self.counter, 'key': 'a'})
+            )
+
+    def test_fresh_fragment_served_from_cache(self):
+        """До мягкого срока фрагмент не рендерится повторно."""
+        self.assertEqual(self.render_at(1000), '1')
+        self.assertEqual(self.render_at(1059), '1')
+        self.assertEqual(self.renders, 1)
+
+    @override_settings(BACKGROUND_JOBS_EAGER=True)
+    def test_stale_fragment_served_while_refreshing(self):
+        """Устаревший фрагмент отдаётся сразу, а обновляется в фоне."""
+        self.render_at(1000)
+        self.assertEqual(self.render_at(1061), '1')
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(self.render_at(1062), '2')
+
+    def test_background_refresh_gets_detached_context(self):
+        """Фоновый рендер не видит изменений контекста запроса."""
+        self.render_at(1000)
+        context = Context({'counter': self.counter, 'key': 'a'})
+        with mock.patch('core.templatetags.swrcache.enqueue') as enqueue, \
+                mock.patch('core.templatetags.swrcache.time.time',
+                           return_value=1061):
+            self.TEMPLATE.render(context)
+        refresh_context = enqueue.call_args[0][1]
+        context['key'] = 'b'
+        self.assertEqual(refresh_context['key'], 'a')
+
+    @override_settings(SWRCACHE_BACKGROUND=False)
+    def test_stale_fragment_refreshed_by_one_request(self):
+        """Без фоновых задач фрагмент обновляет один запрос."""
+        self.render_at(1000)
+        self.assertEqual(self.render_at(1061), '2')
+        self.assertEqual(self.render_at(1061), '2')
+        self.assertEqual(self.renders, 2)
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_has_server_timing(self):
+        """Замеренный запрос отдаёт Server-Timing и пишет строку в лог."""
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get('/')
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'thumb;dur=',
+                       'total;dur='):
+            self.assertIn(metric, header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_measured(self):
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_counters(self):
+        """Счётчики видят SQL, кэш, вложенные шаблоны и миниатюры."""
+        timing.install()
+        cache.set('present', 1)
+
+        class Backend:
+            def get_thumbnail(self, *args, **kwargs):
+                return 'thumbnail'
+
+        timing._patch(Backend, 'get_thumbnail', timing._timed_thumbnail)
+        template = Template('{% include "core/404.html" %}')
+        with timing.measure() as timings:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertEqual(cache.get('present'), 1)
+            self.assertEqual(cache.get('absent', 'default'), 'default')
+            cache.get_many(['present', 'absent'])
+            template.render(Context())
+            Backend().get_thumbnail('image', '320x113')
+        self.assertEqual(timings.queries, 1)
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (2, 2))
+        self.assertEqual(timings.template_depth, 0)
+        self.assertGreater(timings.template, 0)
+        self.assertEqual(timings.thumbnails, 1)
+        self.assertIsNone(timing.current())
+
+
+class PercentileTests(TestCase):
+    def test_nearest_rank(self):
+        """Процентиль — значение с рангом ceil(p/100 * n)."""
+        self.assertEqual(percentile(list(range(1, 11)), 50), 5)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+def authors_view(request):
+    template = Template(
+        '{% for post in posts %}\n'
+        '{{ post.author.username }}\n'
+        '{% endfor %}'
+    )
+    posts = Post.objects.order_by('id')
+    return HttpResponse(template.render(Context({'posts': posts})))
+
+
+urlpatterns = [
+    path('authors/', authors_view, name='authors'),
+]
+
+
+@override_settings(ROOT_URLCONF='core.tests')
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=User.objects.create_user(username=f'author{i}'),
+            )
+
+    def test_repeated_shapes_recorded(self):
+        """Запросы, отличающиеся только параметрами, — одна форма."""
+        ids = list(User.objects.values_list('id', flat=True))
+        with record_query_shapes(threshold=3) as shapes:
+            for pk in ids:
+                User.objects.get(pk=pk)
+            list(User.objects.filter(pk__in=ids[:1]))
+            list(User.objects.filter(pk__in=ids))
+        problems = shapes.problems
+        self.assertEqual(len(problems), 1)
+        self.assertEqual(problems[0].count, 3)
+        self.assertIn('core/tests.py', problems[0].location['code'])
+
+    def test_nplusone_raises_in_tests(self):
+        with self.assertRaisesMessage(NPlusOneError, 'authors'):
+            self.client.get('/authors/')
+
+    @override_settings(NPLUSONE_RAISE=False)
+    def test_nplusone_logged_with_template_line(self):
+        """В продакшене N+1 пишется в лог с view и строкой шаблона."""
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            response = self.client.get('/authors/')
+        self.assertEqual(response.status_code, 200)
+        message = logs.records[0].getMessage()
+        self.assertIn('GET /authors/ (authors)', message)
+        self.assertIn('template <unknown source>:2', message)
+        self.assertIn('"auth_user"', message)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS kvstore ('
+    'key TEXT PRIMARY KEY, value TEXT NOT NULL'
+    ') WITHOUT ROWID'
+)
+
+
+class LRUCache:
+    """Ограниченный по числу записей словарь с вытеснением давних."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class KVStore(KVStoreBase):
+    """Хранилище ключей sorl.thumbnail: LRU в памяти поверх файла SQLite.
+
+    Файл в режиме WAL общий для всех процессов на машине, поэтому
+    миниатюра, созданная одним воркером, сразу видна остальным без
+    обращений к основной базе. Горячие ключи отдаются из памяти
+    процесса; размер LRU задаёт THUMBNAIL_KVSTORE_LRU_SIZE.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 lru_size: Optional[int] = None):
+        super().__init__()
+        self.path = path or settings.THUMBNAIL_KVSTORE_PATH
+        self.lru = LRUCache(lru_size or settings.THUMBNAIL_KVSTORE_LRU_SIZE)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'connection', None)
+        # warm_thumbnail_kvstore() открывает соединение ещё при импорте
+        # wsgi.py; воркеры, порождённые fork, открывают своё.
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(SCHEMA)
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def warm(self, limit: Optional[int] = None) -> int:
+        """Загружает в память до limit записей одним проходом по файлу."""
+        limit = limit or self.lru.max_size
+        rows = self.connection.execute(
+            'SELECT key, value FROM kvstore LIMIT ?', (limit,)
+        )
+        loaded = 0
+        for key, value in rows:
+            self.lru.set(key, value)
+            loaded += 1
+        return loaded
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        value = self.lru.get(key)
+        if value is not None:
+            return value
+        row = self.connection.execute(
+            'SELECT value FROM kvstore WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.lru.set(key, row[0])
+        return row[0]
+
+    def _set_raw(self, key: str, value: str) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            (key, value),
+        )
+        self.lru.set(key, value)
+
+    def _delete_raw(self, *keys: str) -> None:
+        self.connection.executemany(
+            'DELETE FROM kvstore WHERE key = ?', [(key,) for key in keys]
+        )
+        for key in keys:
+            self.lru.delete(key)
+
+    def _find_keys_raw(self, prefix: str) -> List[str]:
+        rows = self.connection.execute(
+            'SELECT key FROM kvstore WHERE key >= ? AND key < ?',
+            (prefix, prefix + '\uffff'),
+        )
+        return [key for key, in rows]
+
+    def clear(self, delete_thumbnails: bool = False) -> None:
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+        super().clear()
+        self.lru.clear()
+
+    def set_many_raw(self, items: Iterable) -> None:
+        """Записывает пары (ключ, значение) одной транзакцией."""
+        items = list(items)
+        conn = self.connection
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+                items,
+            )
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        for key, value in items:
+            self.lru.set(key, value)
+
+
+def warm_thumbnail_kvstore() -> int:
+    """Прогревает LRU хранилища миниатюр при старте воркера."""
+    from sorl.thumbnail import default
+
+    warm = getattr(default.kvstore, 'warm', None)
+    return warm() if warm is not None else 0
@@ -0,0 +1,238 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+from django.utils.module_loading import import_string
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+_missing = object()
+
+
+class RequestTimings:
+    """Счётчики одного запроса: SQL, шаблоны, кэш и миниатюры.
+
+    Время шаблонов — только внешние render(), поэтому вложенные
+    {% include %} и теги включения не считаются дважды. В него входят
+    и ленивые SQL-запросы, и миниатюры, построенные при рендеринге.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_depth = 0
+        self.thumbnails = 0
+        self.thumbnail = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def server_timing(self, total: float) -> str:
+        """Значение заголовка Server-Timing, длительности в мс."""
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} SQL"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'thumb;dur={self.thumbnail * 1000:.1f};'
+            f'desc="{self.thumbnails} thumbnails"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def as_dict(self, total: float) -> Dict:
+        return {
+            'total_ms': round(total * 1000, 2),
+            'db_queries': self.queries,
+            'db_ms': round(self.db * 1000, 2),
+            'template_ms': round(self.template * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'thumbnails': self.thumbnails,
+            'thumbnail_ms': round(self.thumbnail * 1000, 2),
+        }
+
+
+def current() -> Optional[RequestTimings]:
+    """Счётчики запроса, который обрабатывает текущий поток."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def measure():
+    """Собирает счётчики всего, что выполнит текущий поток в блоке."""
+    timings = _local.timings = RequestTimings()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.execute)
+                )
+            yield timings
+    finally:
+        _local.timings = None
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        timings = current()
+        if timings is None:
+            return render(self, context)
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template += time.perf_counter() - started
+    return wrapper
+
+
+def _counted(method, count):
+    """Обёртка чтения из кэша; count() возвращает (попадания, промахи).
+
+    get_many() базового класса читает ключи через get(), поэтому
+    считается только внешний вызов.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        timings = current()
+        if timings is None:
+            return method(self, *args, **kwargs)
+        timings.cache_depth += 1
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            timings.cache_depth -= 1
+        if not timings.cache_depth:
+            hits, misses = count(args, result)
+            timings.cache_hits += hits
+            timings.cache_misses += misses
+        return result
+    return wrapper
+
+
+def _counted_get(get):
+    def count(args, value):
+        return (0, 1) if value is _missing else (1, 0)
+
+    counted = _counted(get, count)
+
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = counted(self, key, _missing, version=version)
+        return default if value is _missing else value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def count(args, values):
+        return len(values), len(args[0]) - len(values)
+
+    counted = _counted(get_many, count)
+
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        return counted(self, list(keys), version=version)
+    return wrapper
+
+
+def _timed_thumbnail(get_thumbnail):
+    @wraps(get_thumbnail)
+    def wrapper(*args, **kwargs):
+        timings = current()
+        if timings is None:
+            return get_thumbnail(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return get_thumbnail(*args, **kwargs)
+        finally:
+            timings.thumbnails += 1
+            timings.thumbnail += time.perf_counter() - started
+    return wrapper
+
+
+def _patch(cls, name: str, decorator) -> None:
+    method = cls.__dict__.get(name) or getattr(cls, name)
+    if getattr(method, '_timed', False):
+        return
+    patched = decorator(method)
+    patched._timed = True
+    setattr(cls, name, patched)
+
+
+def install() -> None:
+    """Подключает счётчики к шаблонам, кэшам и sorl.thumbnail.
+
+    Обёртки ставятся на классы один раз на процесс и ничего не делают
+    в потоках, где не идёт замер запроса.
+    """
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+        _patch(Template, 'render', _timed_render)
+        for cache_class in {type(caches[alias]) for alias in settings.CACHES}:
+            _patch(cache_class, 'get', _counted_get)
+            _patch(cache_class, 'get_many', _counted_get_many)
+        _patch(
+            import_string(thumbnail_settings.THUMBNAIL_BACKEND),
+            'get_thumbnail', _timed_thumbnail,
+        )
+        _installed = True
+
+
+class RequestTimingMiddleware:
+    """Замеряет часть запросов и отдаёт результат в Server-Timing и лог.
+
+    Доля замеряемых запросов задаётся REQUEST_TIMING_SAMPLE_RATE; для
+    остальных middleware стоит одного вызова random(). Каждая
+    замеренная страница пишет в логгер core.timing строку JSON.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with measure() as timings:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = timings.server_timing(total)
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **timings.as_dict(total),
+        }))
+        return response
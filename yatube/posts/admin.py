@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Group, Post, Follow, Comment
+from .search import filter_by_text
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -14,6 +15,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE '%term%'."""
+        if not search_term:
+            return queryset, False
+        return filter_by_text(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin,)
 admin.site.register(Group)
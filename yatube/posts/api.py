@@ -0,0 +1,418 @@
+import json
+from functools import wraps
+from hashlib import md5
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, HttpResponse, JsonResponse, QueryDict
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core.jobs import enqueue
+
+from .forms import CommentForm, PostForm
+from .loaders import get_loader
+from .models import Comment, Follow, Group, Post
+from .paginators import CursorPaginator
+from .thumbnails import warm_post_thumbnails
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BULK_IDS = 100
+
+# Имя поля в ответе -> поле для values(). Связи отдаются
+# человекочитаемыми ключами, как в адресах сайта.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+FOLLOW_FIELDS = {
+    'id': 'id',
+    'user': 'user__username',
+    'author': 'author__username',
+}
+
+
+class ApiError(Exception):
+    """Ошибка запроса к API; отдаётся клиенту как JSON."""
+
+    def __init__(self, status: int, detail, key: str = 'detail'):
+        super().__init__(detail)
+        self.status = status
+        self.payload = {key: detail}
+
+
+class CsrfCheck(CsrfViewMiddleware):
+    """Проверка CSRF, которая возвращает причину отказа, а не страницу."""
+
+    def _reject(self, request, reason):
+        return reason
+
+
+def check_csrf(request: HttpRequest) -> None:
+    """Проверяет CSRF так же, как CsrfViewMiddleware.
+
+    Страница CSRF_FAILURE_VIEW клиенту API не нужна, поэтому отказ
+    превращается в ApiError и уходит как JSON с кодом 403.
+    """
+    reason = CsrfCheck().process_view(request, None, (), {})
+    if reason:
+        raise ApiError(403, f'Проверка CSRF не пройдена: {reason}')
+
+
+def api_view(*methods: str) -> Callable:
+    """Ограничивает методы и превращает ApiError в JSON-ответ.
+
+    CSRF проверяется здесь, а не в middleware, чтобы отказ тоже был
+    ответом API.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                check_csrf(request)
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return JsonResponse(error.payload, status=error.status)
+        return csrf_exempt(require_http_methods(methods)(wrapper))
+    return decorator
+
+
+def json_response(request: HttpRequest, data, status: int = 200):
+    """JSON-ответ с ETag по содержимому.
+
+    Тело собирается из values() и стоит дёшево, поэтому ETag считается
+    по нему самому: если клиент прислал тот же If-None-Match, вместо
+    тела уходит 304.
+    """
+    response = JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder,
+        json_dumps_params={'ensure_ascii': False},
+    )
+    if request.method not in ('GET', 'HEAD') or status != 200:
+        return response
+    response['ETag'] = quote_etag(md5(response.content).hexdigest())
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=0, must_revalidate=True,
+        )
+    patch_vary_headers(response, ('Cookie',))
+    return get_conditional_response(
+        request, etag=response['ETag'], response=response,
+    )
+
+
+def require_user(request: HttpRequest) -> None:
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Требуется авторизация.')
+
+
+def request_data(request: HttpRequest) -> QueryDict:
+    """Данные запроса из JSON-тела или из обычной формы."""
+    if request.content_type != 'application/json':
+        return request.POST.copy()
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Тело запроса не является JSON.')
+    if not isinstance(payload, dict):
+        raise ApiError(400, 'Ожидается JSON-объект.')
+    nested = [
+        name for name, value in payload.items()
+        if isinstance(value, (dict, list))
+    ]
+    if nested:
+        raise ApiError(400, {
+            name: ['Ожидается строка или число.'] for name in nested
+        }, key='errors')
+    data = QueryDict(mutable=True)
+    for name, value in payload.items():
+        data[name] = '' if value is None else value
+    return data
+
+
+def requested_fields(request: HttpRequest, fields: Dict[str, str]) -> List:
+    """Поля из ?fields=id,text; без параметра — все поля ресурса."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(fields)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(400, {
+            'fields': [f'Неизвестные поля: {", ".join(unknown)}.'],
+        }, key='errors')
+    return names
+
+
+def page_size(request: HttpRequest) -> int:
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def present(row: Dict, fields: Dict[str, str], names: Sequence[str]) -> Dict:
+    item = {name: row[fields[name]] for name in names}
+    if 'image' in item:
+        item['image'] = (
+            default_storage.url(item['image']) if item['image'] else None
+        )
+    return item
+
+
+def cursor_page(request: HttpRequest, queryset, fields: Dict[str, str],
+                key) -> Dict:
+    """Страница values() по курсору (дата, id), от новых к старым."""
+    names = requested_fields(request, fields)
+    paginator = CursorPaginator(
+        queryset.values(*{fields[name] for name in names}, *key),
+        page_size(request),
+        key=key,
+    )
+    page = paginator.cursor_page(request.GET.get('cursor'))
+    return {
+        'results': [present(row, fields, names) for row in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def id_page(request: HttpRequest, queryset, fields: Dict[str, str]) -> Dict:
+    """Страница values() по возрастанию id.
+
+    У групп и подписок нет даты, поэтому курсор у них — последний
+    отданный id.
+    """
+    names = requested_fields(request, fields)
+    limit = page_size(request)
+    queryset = queryset.order_by('id')
+    after = request.GET.get('cursor')
+    if after and after.isdigit():
+        queryset = queryset.filter(id__gt=int(after))
+    rows = list(
+        queryset.values(*{fields[name] for name in names}, 'id')[:limit + 1]
+    )
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': [present(row, fields, names) for row in rows],
+        'next_cursor': str(rows[-1]['id']) if has_next else None,
+    }
+
+
+def get_one(request: HttpRequest, queryset, fields: Dict[str, str],
+            detail: str) -> Dict:
+    names = requested_fields(request, fields)
+    row = queryset.values(*{fields[name] for name in names}).first()
+    if row is None:
+        raise ApiError(404, detail)
+    return present(row, fields, names)
+
+
+def form_data(request: HttpRequest, initial: Optional[Dict] = None):
+    """Данные для PostForm: группа в API задаётся slug, а не id."""
+    data = QueryDict(mutable=True)
+    for name, value in (initial or {}).items():
+        data[name] = value
+    incoming = request_data(request)
+    for name in incoming:
+        data.setlist(name, incoming.getlist(name))
+    slug = data.get('group')
+    if slug:
+        group = get_loader(request).group_by_slug(slug)
+        # Неизвестный slug остаётся как есть, и форма его отклонит.
+        data['group'] = group.pk if group is not None else slug
+    return data
+
+
+@api_view('GET', 'POST')
+def posts(request: HttpRequest):
+    """Лента постов с фильтрами ?group= и ?author=; POST создаёт пост."""
+    if request.method == 'POST':
+        require_user(request)
+        form = PostForm(form_data(request), files=request.FILES or None)
+        if not form.is_valid():
+            raise ApiError(400, form.errors, key='errors')
+        post = form.save(commit=False)
+        post.author = request.user
+        post.save()
+        if post.image:
+            enqueue(warm_post_thumbnails, post.pk)
+        return json_response(request, get_one(
+            request, Post.objects.filter(pk=post.pk), POST_FIELDS, '',
+        ), status=201)
+    # Фильтры сводятся к id, чтобы выборка шла по индексам
+    # (group, pub_date, id) и (author, pub_date, id) без JOIN.
+    queryset = Post.objects.all()
+    loader = get_loader(request)
+    if request.GET.get('group'):
+        group = loader.group_by_slug(request.GET['group'])
+        queryset = queryset.filter(group=group) if group else queryset.none()
+    if request.GET.get('author'):
+        author = loader.user_by_username(request.GET['author'])
+        queryset = (
+            queryset.filter(author=author) if author else queryset.none()
+        )
+    return json_response(request, cursor_page(
+        request, queryset, POST_FIELDS, ('pub_date', 'id'),
+    ))
+
+
+@api_view('GET')
+def posts_bulk(request: HttpRequest):
+    """Несколько постов по ?ids=1,2,3 одним запросом, в порядке ids."""
+    try:
+        ids = [
+            int(pk) for pk in request.GET.get('ids', '').split(',')
+            if pk.strip()
+        ]
+    except ValueError:
+        raise ApiError(400, {'ids': ['Ожидаются целые числа.']}, 'errors')
+    if len(ids) > MAX_BULK_IDS:
+        raise ApiError(400, {
+            'ids': [f'Не больше {MAX_BULK_IDS} постов за запрос.'],
+        }, key='errors')
+    names = requested_fields(request, POST_FIELDS)
+    lookups = {POST_FIELDS[name] for name in names} | {'id'}
+    rows = {
+        row['id']: row
+        for row in Post.objects.filter(pk__in=ids).values(*lookups)
+    }
+    return json_response(request, {
+        'results': [
+            present(rows[pk], POST_FIELDS, names)
+            for pk in dict.fromkeys(ids) if pk in rows
+        ],
+        'missing': [pk for pk in dict.fromkeys(ids) if pk not in rows],
+    })
+
+
+@api_view('GET', 'PATCH')
+def post(request: HttpRequest, post_id: int):
+    """Один пост; PATCH меняет текст или группу поста автора."""
+    queryset = Post.objects.filter(pk=post_id)
+    if request.method == 'PATCH':
+        require_user(request)
+        instance = queryset.select_related('group').first()
+        if instance is None:
+            raise ApiError(404, 'Пост не найден.')
+        if instance.author_id != request.user.pk:
+            raise ApiError(403, 'Изменять пост может только автор.')
+        initial = {
+            'text': instance.text,
+            'group': instance.group.slug if instance.group else '',
+        }
+        form = PostForm(form_data(request, initial), instance=instance)
+        if not form.is_valid():
+            raise ApiError(400, form.errors, key='errors')
+        form.save()
+    return json_response(
+        request, get_one(request, queryset, POST_FIELDS, 'Пост не найден.'),
+    )
+
+
+@api_view('GET', 'POST')
+def post_comments(request: HttpRequest, post_id: int):
+    """Комментарии поста по курсору; POST добавляет комментарий."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise ApiError(404, 'Пост не найден.')
+    if request.method == 'POST':
+        require_user(request)
+        form = CommentForm(request_data(request))
+        if not form.is_valid():
+            raise ApiError(400, form.errors, key='errors')
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post_id = post_id
+        comment.save()
+        return json_response(request, get_one(
+            request, Comment.objects.filter(pk=comment.pk),
+            COMMENT_FIELDS, '',
+        ), status=201)
+    return json_response(request, cursor_page(
+        request, Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS, ('created', 'id'),
+    ))
+
+
+@api_view('GET')
+def groups(request: HttpRequest):
+    return json_response(
+        request, id_page(request, Group.objects.all(), GROUP_FIELDS),
+    )
+
+
+@api_view('GET')
+def group(request: HttpRequest, slug: str):
+    return json_response(request, get_one(
+        request, Group.objects.filter(slug=slug), GROUP_FIELDS,
+        'Группа не найдена.',
+    ))
+
+
+@api_view('GET', 'POST')
+def follows(request: HttpRequest):
+    """Подписки текущего пользователя; POST {"author": ...} подписывает."""
+    require_user(request)
+    queryset = Follow.objects.filter(user=request.user)
+    if request.method == 'POST':
+        username = request_data(request).get('author', '')
+        author = get_loader(request).user_by_username(username)
+        if author is None:
+            raise ApiError(400, {
+                'author': ['Пользователь не найден.'],
+            }, key='errors')
+        if author == request.user:
+            raise ApiError(400, {
+                'author': ['Нельзя подписаться на себя.'],
+            }, key='errors')
+        follow, created = Follow.objects.get_or_create(
+            user=request.user, author=author,
+        )
+        return json_response(request, get_one(
+            request, queryset.filter(pk=follow.pk), FOLLOW_FIELDS, '',
+        ), status=201 if created else 200)
+    return json_response(request, id_page(request, queryset, FOLLOW_FIELDS))
+
+
+@api_view('DELETE')
+def follow(request: HttpRequest, username: str):
+    """Отписка от автора."""
+    require_user(request)
+    author = get_loader(request).user_by_username(username)
+    deleted = 0
+    if author is not None:
+        deleted, _ = Follow.objects.filter(
+            user=request.user, author=author,
+        ).delete()
+    if not deleted:
+        raise ApiError(404, 'Подписка не найдена.')
+    return HttpResponse(status=204)
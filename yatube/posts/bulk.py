@@ -0,0 +1,178 @@
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from . import stats, timeline
+from .cache import bump_comments_version, bump_feed_version
+from .models import Comment, Follow, Post
+from .search import install_search_index, uninstall_search_index
+
+
+def bulk_insert(model, objs: Iterable) -> int:
+    """Вставляет объекты одним подготовленным INSERT, без pre_save.
+
+    bulk_create вызывает pre_save полей, и auto_now/auto_now_add
+    затирают даты загружаемых данных текущим временем. Здесь значения
+    берутся из объектов как есть, а текущим временем заполняются
+    только пустые даты. Сигналы не отправляются, id объектам не
+    присваиваются.
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    opts = model._meta
+    fields = [
+        field for field in opts.concrete_fields
+        if not (field.primary_key and objs[0].pk is None)
+    ]
+    now = timezone.now()
+    dated = [
+        field for field in fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for obj in objs:
+        for field in dated:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, now)
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for field in fields
+            ]
+            for obj in objs
+        ])
+    return len(objs)
+
+
+@contextmanager
+def deferred_indexes(rows: Dict, replace: bool = False):
+    """Снимает индексы Meta.indexes на время большой загрузки.
+
+    rows — сколько строк загрузка добавит в таблицу каждой модели.
+    Построить индекс по готовой таблице быстрее, чем обновлять его на
+    каждой вставке, но только если загрузка не меньше уже лежащих
+    строк: иначе пересборка индекса по всей таблице дороже. При
+    replace=True вызывающий сам очистит таблицы внутри блока, и
+    индексы снимаются у всех моделей из rows. Для постов
+    так же откладывается FTS-индекс поиска. Уникальные ограничения
+    остаются: они проверяют загружаемые данные. Индексы внешних
+    ключей тоже остаются: снять их можно только через alter_field,
+    а SQLite при этом пересоздаёт всю таблицу.
+
+    Выход из редактора схемы SQLite проверяет внешние ключи всей базы,
+    поэтому все модели обрабатываются одним редактором до загрузки и
+    одним после, а если откладывать нечего, редактор не открывается.
+    Редактор схемы SQLite не работает внутри транзакции, поэтому блок
+    нельзя вызывать из transaction.atomic().
+    """
+    models = [
+        model for model, count in rows.items()
+        if (model._meta.indexes or model is Post)
+        and (replace or count and count >= model.objects.count())
+    ]
+    if not models:
+        yield
+        return
+    with connection.schema_editor() as editor:
+        for model in models:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+            if model is Post:
+                uninstall_search_index(editor)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+                if model is Post:
+                    install_search_index(editor)
+
+
+def create_posts(posts: List[Post]) -> int:
+    """Создаёт посты пачкой и делает то, что иначе делают сигналы.
+
+    Даты постов сохраняются как есть. Новые посты раскладываются по
+    лентам подписчиков, счётчики авторов сдвигаются, кэш лент
+    сбрасывается. Вызывать внутри транзакции.
+    """
+    if not posts:
+        return 0
+    last_id = Post.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    bulk_insert(Post, posts)
+    # id из вставки не возвращаются: новые посты — это посты авторов
+    # пачки с id больше прежнего максимума.
+    timeline.fan_out_posts(
+        Post.objects
+        .filter(
+            id__gt=last_id,
+            author_id__in={post.author_id for post in posts},
+        )
+        .values_list('id', 'author_id', 'pub_date')
+    )
+    stats.change_many(
+        'posts_count', Counter(post.author_id for post in posts),
+    )
+    bump_feed_version()
+    return len(posts)
+
+
+def create_comments(comments: List[Comment]) -> int:
+    """Создаёт комментарии пачкой; даты created сохраняются как есть."""
+    if not comments:
+        return 0
+    bulk_insert(Comment, comments)
+    stats.change_many(
+        'comments_count', Counter(comment.author_id for comment in comments),
+    )
+    for post_id in {comment.post_id for comment in comments}:
+        bump_comments_version(post_id)
+    return len(comments)
+
+
+def create_follows(pairs: Iterable[Tuple[int, int]],
+                   batch_size: int = None) -> int:
+    """Создаёт подписки (user_id, author_id), которых ещё нет.
+
+    Подписки на себя и повторы пропускаются. Ленты подписчиков
+    дополняются постами авторов.
+    """
+    pairs = {(user_id, author_id) for user_id, author_id in pairs
+             if user_id != author_id}
+    if not pairs:
+        return 0
+    existing = set(
+        Follow.objects
+        .filter(user_id__in={user_id for user_id, _ in pairs})
+        .filter(author_id__in={author_id for _, author_id in pairs})
+        .values_list('user_id', 'author_id')
+    )
+    new = sorted(pairs - existing)
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in new],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    for user_id, author_id in new:
+        timeline.backfill(user_id, author_id)
+    stats.change_many(
+        'followers_count', Counter(author_id for _, author_id in new),
+    )
+    stats.change_many(
+        'following_count', Counter(user_id for user_id, _ in new),
+    )
+    return len(new)
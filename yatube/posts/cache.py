@@ -0,0 +1,194 @@
+from contextlib import nullcontext
+from datetime import datetime
+from functools import wraps
+from hashlib import md5
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+FEED_VERSION_KEY = 'posts:feed_version'
+FEED_CHANGED_KEY = 'posts:feed_changed'
+COMMENTS_VERSION_KEY = 'posts:comments_version:{post_id}'
+COMMENTS_CHANGED_KEY = 'posts:comments_changed:{post_id}'
+PAGE_KEY = 'posts:page:{name}:{version}:{path}'
+PAGE_STATS_KEY = 'posts:page_stats:{name}:{result}'
+PAGE_STATS_RESULTS = ('hit', 'miss')
+
+
+def get_feed_version() -> str:
+    """Возвращает текущую версию кэша лент.
+
+    Версия входит в ключи кэшированных фрагментов, поэтому после её
+    смены старые фрагменты просто перестают запрашиваться и
+    вытесняются по таймауту.
+    """
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        cache.add(FEED_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+def get_feed_changed() -> datetime:
+    """Время последней смены версии кэша лент.
+
+    Если время неизвестно (кэш очищен), считается, что ленты
+    изменились только что: так проверки If-Modified-Since никогда не
+    ответят 304 на устаревшие данные.
+    """
+    changed = cache.get(FEED_CHANGED_KEY)
+    if changed is None:
+        cache.add(FEED_CHANGED_KEY, timezone.now(), None)
+        changed = cache.get(FEED_CHANGED_KEY)
+    return changed
+
+
+def bump_feed_version() -> None:
+    """Делает недействительными все кэшированные фрагменты лент."""
+    cache.set_many({
+        FEED_VERSION_KEY: uuid4().hex,
+        FEED_CHANGED_KEY: timezone.now(),
+    }, None)
+
+
+def get_comments_version(post_id: int) -> str:
+    """Версия комментариев поста для ключа кэша его страницы."""
+    key = COMMENTS_VERSION_KEY.format(post_id=post_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def get_comments_changed(post_id: int) -> datetime:
+    """Время последней смены версии комментариев поста.
+
+    Удаление комментария не оставляет даты в таблице, поэтому
+    Last-Modified страницы поста берётся отсюда; неизвестное время,
+    как и в get_feed_changed(), считается текущим.
+    """
+    key = COMMENTS_CHANGED_KEY.format(post_id=post_id)
+    changed = cache.get(key)
+    if changed is None:
+        cache.add(key, timezone.now(), None)
+        changed = cache.get(key)
+    return changed
+
+
+def bump_comments_version(post_id: int) -> None:
+    cache.set_many({
+        COMMENTS_VERSION_KEY.format(post_id=post_id): uuid4().hex,
+        COMMENTS_CHANGED_KEY.format(post_id=post_id): timezone.now(),
+    }, None)
+
+
+def _count(name: str, result: str) -> None:
+    key = PAGE_STATS_KEY.format(name=name, result=result)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик вытеснили между add и incr: одно событие не важно.
+        pass
+
+
+def get_page_cache_stats(names) -> Dict[str, Dict[str, int]]:
+    """Счётчики попаданий и промахов кэша страниц по представлениям."""
+    keys = {
+        PAGE_STATS_KEY.format(name=name, result=result): (name, result)
+        for name in names
+        for result in PAGE_STATS_RESULTS
+    }
+    values = cache.get_many(keys)
+    stats = {name: dict.fromkeys(PAGE_STATS_RESULTS, 0) for name in names}
+    for key, value in values.items():
+        name, result = keys[key]
+        stats[name][result] = value
+    return stats
+
+
+def reset_page_cache_stats(names) -> None:
+    cache.delete_many([
+        PAGE_STATS_KEY.format(name=name, result=result)
+        for name in names
+        for result in PAGE_STATS_RESULTS
+    ])
+
+
+def single_flight(key: str):
+    """Блокировка пересчёта ключа, если бэкенд кэша её умеет.
+
+    core.sqlite_cache.SQLiteCache блокирует ключ для всех воркеров
+    машины; у остальных бэкендов блокировки нет, и блок выполняется
+    сразу.
+    """
+    lock = getattr(cache, 'lock', None)
+    if lock is None:
+        return nullcontext()
+    return lock(key, timeout=settings.POSTS_PAGE_LOCK_TIMEOUT)
+
+
+def cache_anonymous_page(name: str,
+                         version_func: Optional[Callable] = None
+                         ) -> Callable:
+    """Кэширует страницу целиком для анонимных посетителей.
+
+    В ключ входят версия кэша лент (её меняют посты, группы и
+    пользователи), версия из version_func и полный путь с
+    параметрами. Пользователям страницы не кэшируются: у них свои
+    шапка, кнопки подписки и формы комментариев. Попадание в кэш
+    тоже отвечает 304 по сохранённым ETag и Last-Modified, не
+    обращаясь к базе.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.user.is_authenticated
+                or request.method not in ('GET', 'HEAD')
+                or not settings.POSTS_PAGE_CACHE_TIMEOUT
+            ):
+                return view(request, *args, **kwargs)
+            version = get_feed_version()
+            if version_func is not None:
+                version = f'{version}:{version_func(*args, **kwargs)}'
+            key = PAGE_KEY.format(
+                name=name,
+                version=version,
+                path=md5(request.get_full_path().encode()).hexdigest(),
+            )
+            response = cache.get(key)
+            if response is None:
+                # Пока один воркер рендерит страницу, остальные ждут
+                # его результата, а не рендерят её одновременно.
+                with single_flight(key):
+                    response = cache.get(key)
+                    if response is None:
+                        _count(name, 'miss')
+                        response = view(request, *args, **kwargs)
+                        if (
+                            request.method == 'GET'
+                            and response.status_code == 200
+                        ):
+                            cache.set(
+                                key, response,
+                                settings.POSTS_PAGE_CACHE_TIMEOUT,
+                            )
+                        return response
+            _count(name, 'hit')
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified', '')
+                ),
+                response=response,
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,48 @@
+from hashlib import md5
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_KEY = 'posts:card:{variant}:{post_id}:{updated}:{image}'
+
+
+def card_key(post: Post, variant: str) -> str:
+    """Ключ карточки: меняется вместе с постом и его картинкой.
+
+    post.updated сдвигается при сохранении поста, а также при
+    изменении его автора или группы (см. signals.touch_*), поэтому
+    устаревшие карточки просто перестают запрашиваться.
+    """
+    return CARD_KEY.format(
+        variant=variant,
+        post_id=post.pk,
+        updated=post.updated.timestamp(),
+        image=md5(post.image.name.encode()).hexdigest()[:8],
+    )
+
+
+def render_cards(posts: Iterable[Post], variant: str) -> List[str]:
+    """HTML карточек постов: из кэша одним get_many, остальные рендером.
+
+    variant выбирает вид карточки: 'feed' для общих лент, 'group' на
+    странице группы, 'profile' на странице автора.
+    """
+    posts = list(posts)
+    keys = [card_key(post, variant) for post in posts]
+    cards = cache.get_many(keys)
+    rendered = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            rendered[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'variant': variant}
+            )
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
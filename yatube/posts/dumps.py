@@ -0,0 +1,89 @@
+import datetime
+import gzip
+import json
+import os
+from typing import Dict, Iterator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Group, Post
+
+MANIFEST = 'manifest.json'
+# Порядок загрузки: сначала таблицы, на которые ссылаются остальные.
+# Ленты и счётчики в дамп не попадают: они пересобираются по данным.
+MODELS = (Group, Post, Comment, Follow)
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """Даты пишутся с микросекундами, без усечения DjangoJSONEncoder."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def columns(model) -> List[str]:
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def chunk_name(model, number: int) -> str:
+    return f'{model._meta.model_name}-{number:05d}.jsonl.gz'
+
+
+class ChunkWriter:
+    """Пишет строки в сжатые файлы JSONL по rows_per_file в каждом."""
+
+    def __init__(self, directory: str, model, rows_per_file: int):
+        self.directory = directory
+        self.model = model
+        self.rows_per_file = rows_per_file
+        self.files: List[str] = []
+        self.rows = 0
+        self._file = None
+        self._rows_in_file = 0
+
+    def write(self, row: Dict) -> None:
+        if self._file is None or self._rows_in_file >= self.rows_per_file:
+            self._open_next()
+        self._file.write(json.dumps(row, cls=DumpEncoder))
+        self._file.write('\n')
+        self._rows_in_file += 1
+        self.rows += 1
+
+    def _open_next(self) -> None:
+        self.close()
+        name = chunk_name(self.model, len(self.files) + 1)
+        self.files.append(name)
+        # Уровень 1: сжатие почти не уступает 9, а пишет в разы быстрее.
+        self._file = gzip.open(
+            os.path.join(self.directory, name), 'wt',
+            encoding='utf-8', compresslevel=1,
+        )
+        self._rows_in_file = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_chunk(path: str) -> Iterator[Dict]:
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            yield json.loads(line)
+
+
+def write_manifest(directory: str, manifest: Dict) -> None:
+    with open(os.path.join(directory, MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+
+def read_manifest(directory: str) -> Dict:
+    with open(os.path.join(directory, MANIFEST)) as file:
+        return json.load(file)
+
+
+def throughput(label: str, rows: int, elapsed: float) -> str:
+    rate = rows / elapsed if elapsed else 0
+    return f'{label}: {rows} строк за {elapsed:.1f} с ({rate:.0f} строк/с)'
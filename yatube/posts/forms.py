@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from .images import process_image
 from .models import Post, Comment
 from django.forms.widgets import Textarea, Select
 
@@ -13,6 +15,13 @@ class PostForm(forms.ModelForm):
         'group': Select,
     }
 
+    def clean_image(self):
+        """Ограничивает и уменьшает новую картинку до сохранения."""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return process_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
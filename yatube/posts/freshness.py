@@ -0,0 +1,121 @@
+from datetime import datetime
+from functools import wraps
+from hashlib import md5
+from typing import Callable, NamedTuple, Optional
+
+from django.db.models import Count, Max
+from django.http import HttpRequest
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache import get_comments_changed, get_feed_changed, get_feed_version
+from .loaders import get_loader
+from .models import Comment
+
+
+class Freshness(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+def _freshness(request: HttpRequest, *parts,
+               timestamps: Optional[tuple] = ()) -> Freshness:
+    """Собирает валидаторы страницы из состояния лент и её данных.
+
+    Версия кэша лент меняется при любом изменении постов, групп
+    и пользователей, поэтому для лент её и времени её смены хватает:
+    считать посты в базе не нужно, а правки и удаления, которые не
+    двигают pub_date, тоже меняют ETag и Last-Modified. Пользователь
+    входит в ETag, потому что шапка и формы у каждого свои.
+
+    Last-Modified должен меняться вместе с ETag, иначе клиент,
+    присылающий только If-Modified-Since, получит устаревший 304.
+    Если в parts есть состояние без даты изменения, timestamps=None
+    отключает Last-Modified, и страница проверяется только по ETag.
+    """
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    etag = md5(
+        ':'.join(map(str, (get_feed_version(), user, *parts))).encode()
+    ).hexdigest()
+    if timestamps is None:
+        return Freshness(etag, None)
+    last_modified = max(
+        ts for ts in (get_feed_changed(), *timestamps) if ts is not None
+    )
+    return Freshness(etag, last_modified)
+
+
+def index_freshness(request: HttpRequest) -> Freshness:
+    return _freshness(request)
+
+
+def group_freshness(request: HttpRequest, slug: str) -> Freshness:
+    group = get_loader(request).group_by_slug(slug)
+    return _freshness(request, group.pk if group else 'missing')
+
+
+def profile_freshness(request: HttpRequest, username: str) -> Freshness:
+    loader = get_loader(request)
+    author = loader.user_by_username(username)
+    if author is None:
+        return _freshness(request, 'missing')
+    if not request.user.is_authenticated:
+        return _freshness(request, author.pk)
+    # У подписки и отписки нет даты, поэтому пользователю страница
+    # автора отдаётся без Last-Modified.
+    return _freshness(
+        request, author.pk, loader.is_following(author), timestamps=None,
+    )
+
+
+def post_freshness(request: HttpRequest, post_id: int) -> Freshness:
+    state = Comment.objects.filter(post_id=post_id).aggregate(
+        count=Count('id'), newest=Max('created'),
+    )
+    return _freshness(
+        request, post_id, state['count'], state['newest'],
+        timestamps=(state['newest'], get_comments_changed(post_id)),
+    )
+
+
+def conditional_page(freshness_func: Callable) -> Callable:
+    """Условный GET для страницы с лентой или постом.
+
+    Отвечает 304, если ETag или Last-Modified из freshness_func
+    совпали с заголовками запроса. Свежесть считается один раз на
+    запрос. Ответы анонимам можно хранить в общих кэшах, ответы
+    пользователям — только в браузере; в обоих случаях кэш обязан
+    перепроверять страницу, а ответ зависит от cookie.
+    """
+    def get_freshness(request, *args, **kwargs) -> Freshness:
+        if not hasattr(request, '_freshness'):
+            request._freshness = freshness_func(request, *args, **kwargs)
+        return request._freshness
+
+    def decorator(view: Callable) -> Callable:
+        conditional_view = condition(
+            etag_func=lambda *args, **kwargs: (
+                get_freshness(*args, **kwargs).etag
+            ),
+            last_modified_func=lambda *args, **kwargs: (
+                get_freshness(*args, **kwargs).last_modified
+            ),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and (
+                response.status_code in (200, 304)
+            ):
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True, max_age=0)
+                else:
+                    patch_cache_control(
+                        response, public=True, max_age=0,
+                        must_revalidate=True,
+                    )
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,165 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, в которых оригинал сохраняется как есть; остальное
+# перекодируется в JPEG.
+KEEP_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+# Только JPEG умеет декодироваться сразу в уменьшенном масштабе;
+# остальные форматы перед уменьшением распаковываются целиком.
+DRAFT_FORMATS = {'JPEG'}
+EXIF_ORIENTATION = 0x0112
+# Ориентации EXIF, при которых ширина и высота меняются местами.
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+
+
+def _open(uploaded) -> Image.Image:
+    """Открывает загрузку, читая только заголовок, без декодирования."""
+    uploaded.seek(0)
+    try:
+        return Image.open(uploaded)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Изображение слишком большое.', code='image_too_large'
+        )
+
+
+def _fit(size, max_size):
+    """Размер, в который картинка size вписывается в max_size."""
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def max_pixels(image: Image.Image) -> int:
+    """Лимит пикселей для формата картинки.
+
+    JPEG уменьшается ещё при декодировании, поэтому для него лимит
+    выше; PNG, WebP и прочие форматы распаковываются в память целиком,
+    и для них действует POST_IMAGE_MAX_PIXELS_FULL_DECODE.
+    """
+    if image.format in DRAFT_FORMATS:
+        return settings.POST_IMAGE_MAX_PIXELS
+    return min(
+        settings.POST_IMAGE_MAX_PIXELS,
+        settings.POST_IMAGE_MAX_PIXELS_FULL_DECODE,
+    )
+
+
+def check_image(uploaded) -> Image.Image:
+    """Проверяет размер файла и число пикселей по заголовку.
+
+    Пиксели не декодируются, поэтому «бомба распаковки» — маленький
+    файл с огромными размерами — отклоняется до выделения памяти.
+    """
+    if uploaded.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+        raise ValidationError(
+            f'Файл больше {limit} МБ.', code='file_too_large'
+        )
+    image = _open(uploaded)
+    width, height = image.size
+    if width * height > max_pixels(image):
+        raise ValidationError(
+            f'Изображение {width}x{height} слишком большое.',
+            code='image_too_large',
+        )
+    return image
+
+
+def needs_processing(image: Image.Image) -> bool:
+    """Нужно ли пересохранять оригинал.
+
+    Пересохраняются картинки больше POST_IMAGE_MAX_DIMENSIONS,
+    картинки с EXIF (в нём бывают координаты съёмки) и форматы,
+    которые не отдаются браузерам как есть.
+    """
+    max_width, max_height = settings.POST_IMAGE_MAX_DIMENSIONS
+    width, height = image.size
+    return (
+        width > max_width
+        or height > max_height
+        or image.format not in KEEP_FORMATS
+        or bool(image.info.get('exif'))
+        or bool(image.getexif())
+    )
+
+
+def process_image(uploaded):
+    """Проверяет загруженную картинку и при необходимости уменьшает её.
+
+    Возвращает либо исходный файл, либо новый файл во временном
+    каталоге на диске: уменьшенный до POST_IMAGE_MAX_DIMENSIONS,
+    повёрнутый по EXIF и без метаданных. JPEG декодируется сразу
+    в уменьшенном масштабе (draft), поэтому память на обработку
+    зависит от размера результата, а не оригинала; для остальных
+    форматов память ограничена POST_IMAGE_MAX_PIXELS_FULL_DECODE.
+    """
+    image = check_image(uploaded)
+    if not needs_processing(image):
+        uploaded.seek(0)
+        return uploaded
+    image_format = image.format if image.format in KEEP_FORMATS else 'JPEG'
+    max_size = settings.POST_IMAGE_MAX_DIMENSIONS
+    # exif_transpose() и convert() возвращают копии: закрываются
+    # все промежуточные картинки, а не только последняя.
+    opened = [image]
+    try:
+        # Лимит применяется к картинке, уже повёрнутой по EXIF: иначе
+        # при неквадратном лимите поворот вывел бы её за лимит. Сам
+        # поворот делается после уменьшения, чтобы не копировать
+        # оригинал целиком, поэтому размер считается для повёрнутой
+        # картинки и переводится обратно в исходную ориентацию.
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            fitted_height, fitted_width = _fit((height, width), max_size)
+        else:
+            fitted_width, fitted_height = _fit((width, height), max_size)
+        # JPEG декодируется сразу с уменьшением в 2, 4 или 8 раз,
+        # но не меньше нужного размера; для других форматов no-op.
+        image.draft('RGB', (fitted_width, fitted_height))
+        image.thumbnail(
+            (fitted_width, fitted_height), Image.LANCZOS, reducing_gap=None,
+        )
+        image = ImageOps.exif_transpose(image)
+        opened.append(image)
+        # Метаданные в файл не попадают: save() пишет EXIF только
+        # если его передать явно.
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+            opened.append(image)
+        name = os.path.splitext(os.path.basename(uploaded.name))[0]
+        processed = UploadedFile(
+            file=tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR),
+            name=name + EXTENSIONS[image_format],
+            content_type=KEEP_FORMATS[image_format],
+        )
+        save_options = {}
+        if image_format in ('JPEG', 'WEBP'):
+            save_options['quality'] = settings.POST_IMAGE_QUALITY
+        image.save(processed, format=image_format, **save_options)
+    except (OSError, ValueError):
+        raise ValidationError(
+            'Не удалось обработать изображение.', code='invalid_image'
+        )
+    finally:
+        for item in opened:
+            item.close()
+    processed.size = processed.tell()
+    processed.seek(0)
+    return processed
@@ -0,0 +1,86 @@
+from typing import Dict, Optional
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, HttpRequest
+
+from .models import Follow, Group
+
+User = get_user_model()
+
+
+class IdentityMap:
+    """Объекты одной модели, загруженные за время запроса.
+
+    Хранит объекты по уникальному полю (username, slug) и запоминает
+    промахи, поэтому каждый объект читается из базы не больше одного
+    раза.
+    """
+
+    def __init__(self, queryset, field: str):
+        self.queryset = queryset
+        self.field = field
+        self.by_field: Dict[str, Optional[object]] = {}
+
+    def add(self, obj) -> None:
+        self.by_field[getattr(obj, self.field)] = obj
+
+    def get_by_field(self, value: str) -> Optional[object]:
+        if value not in self.by_field:
+            for obj in self.queryset.filter(**{self.field: value}):
+                self.add(obj)
+            self.by_field.setdefault(value, None)
+        return self.by_field[value]
+
+
+class Loader:
+    """Пользователи, группы и подписки в пределах одного запроса.
+
+    Представления и функции свежести страниц обращаются к одним и тем
+    же авторам, группам и подпискам; загрузчик читает каждый из них
+    из базы один раз и дальше отдаёт уже прочитанный.
+    """
+
+    def __init__(self, request: HttpRequest):
+        self.request = request
+        self.users = IdentityMap(User.objects.all(), 'username')
+        self.groups = IdentityMap(Group.objects.all(), 'slug')
+        self.following: Dict[int, bool] = {}
+        if request.user.is_authenticated:
+            self.users.add(request.user)
+
+    def user_by_username(self, username: str) -> Optional[User]:
+        return self.users.get_by_field(username)
+
+    def group_by_slug(self, slug: str) -> Optional[Group]:
+        return self.groups.get_by_field(slug)
+
+    def is_following(self, author: User) -> bool:
+        """Подписан ли пользователь запроса на автора."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return False
+        if author.pk not in self.following:
+            self.following[author.pk] = Follow.objects.filter(
+                user=user, author=author
+            ).exists()
+        return self.following[author.pk]
+
+    def user_or_404(self, username: str) -> User:
+        user = self.user_by_username(username)
+        if user is None:
+            raise Http404('Пользователь не найден.')
+        return user
+
+    def group_or_404(self, slug: str) -> Group:
+        group = self.group_by_slug(slug)
+        if group is None:
+            raise Http404('Группа не найдена.')
+        return group
+
+
+def get_loader(request: HttpRequest) -> Loader:
+    """Загрузчик текущего запроса; создаётся при первом обращении."""
+    loader = getattr(request, '_posts_loader', None)
+    if loader is None:
+        loader = request._posts_loader = Loader(request)
+    return loader
@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageDraw
+
+from posts.images import check_image, process_image
+
+EXIF_ORIENTATION = 0x0112
+
+
+def peak_rss_kb() -> int:
+    """Пиковый RSS текущего процесса в килобайтах (Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_upload(path: str) -> TemporaryUploadedFile:
+    """Загрузка, как её создаёт TemporaryFileUploadHandler."""
+    uploaded = TemporaryUploadedFile(
+        name=os.path.basename(path),
+        content_type='image/jpeg',
+        size=os.path.getsize(path),
+        charset=None,
+    )
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            uploaded.write(chunk)
+    uploaded.seek(0)
+    return uploaded
+
+
+def full_decode(path: str) -> None:
+    """Прежнее поведение: оригинал целиком декодируется при чтении."""
+    uploaded = make_upload(path)
+    forms.ImageField().clean(uploaded)
+    with Image.open(uploaded.temporary_file_path()) as image:
+        image.load()
+
+
+def header_only(path: str) -> None:
+    """Только проверка заголовка: нижняя граница для сравнения."""
+    uploaded = make_upload(path)
+    forms.ImageField().clean(uploaded)
+    try:
+        check_image(uploaded).close()
+    except ValidationError:
+        pass
+
+
+def bounded(path: str) -> None:
+    """Проверка заголовка и уменьшение через posts.images.
+
+    Картинка сверх лимита пикселей отклоняется — это тоже результат:
+    память на отказ и есть то, что стоит такая загрузка.
+    """
+    uploaded = make_upload(path)
+    forms.ImageField().clean(uploaded)
+    try:
+        process_image(uploaded)
+    except ValidationError:
+        pass
+
+
+SCENARIOS = (
+    ('только заголовок', header_only),
+    ('полное декодирование', full_decode),
+    ('posts.images.process_image', bounded),
+)
+
+
+def run_in_child(func, path, conn) -> None:
+    before = peak_rss_kb()
+    started = time.perf_counter()
+    func(path)
+    conn.send((peak_rss_kb() - before, time.perf_counter() - started))
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет пиковую память на одну загрузку картинки: полное '
+        'декодирование оригинала против posts.images.process_image.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=8000)
+        parser.add_argument('--height', type=int, default=6000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--format', default='JPEG', choices=('JPEG', 'PNG', 'WEBP'),
+            help='Формат оригинала; PNG и WebP не уменьшаются при чтении.',
+        )
+
+    def make_source(self, path, width, height, image_format):
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        for i in range(0, width, max(width // 40, 1)):
+            draw.rectangle((i, 0, i + width // 80, height), fill='teal')
+        exif = image.getexif()
+        exif[EXIF_ORIENTATION] = 6
+        image.save(path, format=image_format, quality=90, exif=exif)
+
+    def measure(self, func, path):
+        # Каждый замер идёт в отдельном процессе: ru_maxrss только
+        # растёт, и без этого замеры влияли бы друг на друга.
+        context = multiprocessing.get_context('fork')
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(
+            target=run_in_child, args=(func, path, child_conn)
+        )
+        process.start()
+        result = parent_conn.recv()
+        process.join()
+        return result
+
+    def handle(self, *args, **options):
+        width, height = options['width'], options['height']
+        image_format = options['format']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'source.{image_format.lower()}')
+            self.make_source(path, width, height, image_format)
+            self.stdout.write(
+                f'Оригинал: {width}x{height} '
+                f'({width * height / 1e6:.1f} Мп), '
+                f'{os.path.getsize(path) / 1024:.0f} КБ {image_format}'
+            )
+            for name, func in SCENARIOS:
+                results = [
+                    self.measure(func, path)
+                    for _ in range(options['repeat'])
+                ]
+                peak = max(rss for rss, _ in results)
+                elapsed = min(seconds for _, seconds in results)
+                self.stdout.write(
+                    f'{name:<28} {peak / 1024:8.1f} МБ пик '
+                    f'{elapsed * 1e3:8.1f} мс'
+                )
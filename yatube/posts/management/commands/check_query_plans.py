@@ -0,0 +1,176 @@
+import uuid
+from contextlib import contextmanager
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from posts import views
+from posts.models import Follow, Post
+
+# Признак плана, при котором индекс не покрывает ORDER BY
+# и строки досортировываются во временном B-дереве.
+BAD_PLAN_MARKERS = ('USE TEMP B-TREE',)
+
+
+def empty_cache():
+    """Настройки с пустым кэшем, видимым только этому прогону.
+
+    Иначе страницы, фрагменты и карточки прошлого прогона отдаются
+    из кэша, представления не делают запросов и проверять нечего.
+    """
+    return override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'check-query-plans-{uuid.uuid4()}',
+        },
+    })
+
+
+@contextmanager
+def capture_sql():
+    """Собирает SQL и параметры всех запросов внутри блока."""
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield statements
+
+
+def is_full_scan(sql: str, detail: str) -> bool:
+    """Строка плана вида «SCAN TABLE x» без индекса.
+
+    Чтение всей таблицы без WHERE и ORDER BY (например, список групп
+    для формы) проблемой не считается: оно полное по смыслу.
+    """
+    words = detail.split()
+    filtered = ' WHERE ' in sql or ' ORDER BY ' in sql
+    return (
+        filtered
+        and bool(words)
+        and words[0] == 'SCAN'
+        and 'INDEX' not in words
+        and 'posts_' in detail
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет представления posts/views.py и проверяет '
+        'EXPLAIN QUERY PLAN каждого их SELECT-запроса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Печатать планы всех запросов, а не только плохих.',
+        )
+
+    def get_requests(self):
+        """Запросы к представлениям на данных из текущей базы."""
+        post = Post.objects.select_related('author', 'group').first()
+        if post is None:
+            raise CommandError(
+                'В базе нет постов: нечего проверять. '
+                'Заполните базу, например командой seed.'
+            )
+        follow = Follow.objects.select_related('user').first()
+        reader = follow.user if follow else post.author
+        factory = RequestFactory()
+        group_posts = []
+        if post.group is not None:
+            group_posts.append((
+                'group_posts', views.group_posts,
+                factory.get(f'/group/{post.group.slug}/'),
+                {'slug': post.group.slug}, AnonymousUser(),
+            ))
+        return [
+            (
+                'index', views.index, factory.get('/'),
+                {}, AnonymousUser(),
+            ),
+            *group_posts,
+            (
+                'profile', views.profile,
+                factory.get(f'/profile/{post.author.username}/'),
+                {'username': post.author.username}, reader,
+            ),
+            (
+                'post_detail', views.post_detail,
+                factory.get(f'/posts/{post.pk}/'),
+                {'post_id': post.pk}, AnonymousUser(),
+            ),
+            (
+                'post_comments', views.post_comments,
+                factory.get(f'/posts/{post.pk}/comments/'),
+                {'post_id': post.pk}, AnonymousUser(),
+            ),
+            (
+                'post_edit', views.post_edit,
+                factory.get(f'/posts/{post.pk}/edit/'),
+                {'post_id': post.pk}, post.author,
+            ),
+            (
+                'post_create', views.post_create,
+                factory.get('/create/'), {}, post.author,
+            ),
+            (
+                'follow_index', views.follow_index,
+                factory.get('/follow/'), {}, reader,
+            ),
+        ]
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов поддерживает только SQLite.')
+        problems = 0
+        with empty_cache():
+            for request in self.get_requests():
+                problems += self.check_view(*request, **options)
+        if problems:
+            raise CommandError(f'Найдено проблем в планах: {problems}')
+        self.stdout.write(self.style.SUCCESS(
+            'Все запросы представлений используют индексы.'
+        ))
+
+    def check_view(self, name, view, request, kwargs, user, **options):
+        """Выполняет представление и печатает плохие планы его запросов."""
+        request.user = user
+        with capture_sql() as statements:
+            view(request, **kwargs)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{name}: {len(statements)} запросов'
+        ))
+        if not statements:
+            raise CommandError(
+                f'{name}: представление не выполнило ни одного запроса, '
+                'проверять нечего.'
+            )
+        problems = 0
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.explain(sql, params)
+            bad = [
+                detail for detail in plan
+                if is_full_scan(sql, detail)
+                or any(marker in detail for marker in BAD_PLAN_MARKERS)
+            ]
+            if not bad and not options['verbose_plans']:
+                continue
+            self.stdout.write(f'  {sql}')
+            for detail in plan:
+                style = self.style.ERROR if detail in bad else str
+                self.stdout.write(style(f'    {detail}'))
+            problems += len(bad)
+        return problems
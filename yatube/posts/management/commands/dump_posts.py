@@ -0,0 +1,67 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts import dumps
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает группы, посты, комментарии и подписки '
+        'в сжатые файлы JSONL для restore_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для дампа.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк за одно чтение из базы.',
+        )
+        parser.add_argument(
+            '--rows-per-file', type=int, default=100000,
+            help='Строк в одном файле дампа.',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        os.makedirs(directory, exist_ok=True)
+        if os.listdir(directory):
+            raise CommandError(f'Каталог {directory} не пуст.')
+        manifest = {'created': timezone.now().isoformat(), 'tables': []}
+        total_rows = 0
+        started = time.monotonic()
+        # Одна транзакция: все таблицы выгружаются из одного снимка.
+        with transaction.atomic():
+            for model in dumps.MODELS:
+                table_started = time.monotonic()
+                fields = dumps.columns(model)
+                writer = dumps.ChunkWriter(
+                    directory, model, options['rows_per_file']
+                )
+                rows = (
+                    model.objects.order_by('pk').values(*fields)
+                    .iterator(chunk_size=options['chunk_size'])
+                )
+                try:
+                    for row in rows:
+                        writer.write(row)
+                finally:
+                    writer.close()
+                manifest['tables'].append({
+                    'model': model._meta.label,
+                    'columns': fields,
+                    'rows': writer.rows,
+                    'files': writer.files,
+                })
+                total_rows += writer.rows
+                self.stdout.write(dumps.throughput(
+                    model._meta.label, writer.rows,
+                    time.monotonic() - table_started,
+                ))
+        dumps.write_manifest(directory, manifest)
+        self.stdout.write(self.style.SUCCESS(dumps.throughput(
+            'Всего', total_rows, time.monotonic() - started,
+        )))
@@ -0,0 +1,296 @@
+import csv
+import gzip
+import json
+import os
+import time
+from hashlib import md5
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import bulk
+from posts.models import Comment, Group, ImportCheckpoint, Post
+
+User = get_user_model()
+
+REPORT_EVERY = 5
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    """Строку нельзя импортировать; она пропускается."""
+
+
+def open_source(path: str):
+    """Открывает файл как текст; .gz распаковывается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_records(stream, fmt: str):
+    """Записи файла по одной; весь файл в память не читается."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        # Строка JSONL разбирается позже: при продолжении импорта
+        # уже записанные строки только пропускаются.
+        yield line
+
+
+def parse_record(record) -> dict:
+    if isinstance(record, dict):
+        return record
+    try:
+        data = json.loads(record)
+    except ValueError as error:
+        raise RowError(f'некорректный JSON: {error}')
+    if not isinstance(data, dict):
+        raise RowError('ожидается JSON-объект')
+    return data
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    date = parse_datetime(str(value))
+    if date is None:
+        raise RowError(f'некорректная дата {value!r}')
+    if settings.USE_TZ and timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def required(data: dict, name: str) -> str:
+    value = data.get(name)
+    if value in (None, ''):
+        raise RowError(f'не заполнено поле {name}')
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково импортирует посты, комментарии или подписки из JSONL '
+        'или CSV (в том числе .gz) пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'kind', choices=('posts', 'comments', 'follows'),
+            help='Что импортировать.',
+        )
+        parser.add_argument('path', help='Путь к файлу JSONL или CSV.')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла; по умолчанию по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, где остановился прошлый запуск.',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать отсутствующих пользователей без пароля.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        fmt = options['format'] or (
+            'csv' if path.replace('.gz', '').endswith('.csv') else 'jsonl'
+        )
+        self.kind = options['kind']
+        self.create_users = options['create_users']
+        self.errors = 0
+        checkpoint = self.get_checkpoint(path, options['resume'])
+        handler = getattr(self, f'import_{self.kind}')
+        batch_size = options['batch_size']
+
+        position = start = checkpoint.rows
+        written = 0
+        started = last_report = time.monotonic()
+        with open_source(path) as stream:
+            records = islice(read_records(stream, fmt), start, None)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                rows = []
+                for offset, record in enumerate(batch, position + 1):
+                    if isinstance(record, str) and not record.strip():
+                        continue
+                    try:
+                        rows.append((offset, parse_record(record)))
+                    except RowError as error:
+                        self.skip(offset, error)
+                position += len(batch)
+                # Позиция пишется в той же транзакции, что и пачка:
+                # после сбоя --resume не повторит и не потеряет строки.
+                with transaction.atomic():
+                    written += handler(rows)
+                    ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                        rows=position, updated=timezone.now(),
+                    )
+                now = time.monotonic()
+                if now - last_report >= REPORT_EVERY:
+                    last_report = now
+                    self.stdout.write(self.report_line(
+                        position - start, written, now - started,
+                    ))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            self.report_line(position - start, written, elapsed)
+            + f', пропущено {self.errors}'
+        ))
+
+    def get_checkpoint(self, path: str, resume: bool) -> ImportCheckpoint:
+        source = f'{self.kind}:{os.path.realpath(path)}'
+        if len(source) > 255:
+            source = f'{self.kind}:{md5(source.encode()).hexdigest()}'
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+        if resume:
+            if checkpoint.rows:
+                self.stdout.write(
+                    f'Продолжение со строки {checkpoint.rows + 1}'
+                )
+        elif checkpoint.rows:
+            checkpoint.rows = 0
+            checkpoint.save(update_fields=('rows', 'updated'))
+        return checkpoint
+
+    def report_line(self, rows: int, written: int, elapsed: float) -> str:
+        rate = rows / elapsed if elapsed else 0
+        return (
+            f'Обработано {rows} строк, записано {written} '
+            f'за {elapsed:.1f} с ({rate:.0f} строк/с)'
+        )
+
+    def skip(self, position: int, error: Exception) -> None:
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Строка {position} пропущена: {error}')
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Дальнейшие пропуски только считаются.')
+
+    def resolve_users(self, usernames) -> dict:
+        """Пользователи пачки одним запросом: username -> id."""
+        usernames = set(usernames)
+        users = dict(
+            User.objects.filter(username__in=usernames)
+            .values_list('username', 'id')
+        )
+        missing = usernames - set(users)
+        if missing and self.create_users:
+            new_users = []
+            for username in sorted(missing):
+                user = User(username=username)
+                user.set_unusable_password()
+                new_users.append(user)
+            User.objects.bulk_create(new_users)
+            users.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'id')
+            )
+        return users
+
+    def build(self, rows, make) -> list:
+        objects = []
+        for position, data in rows:
+            try:
+                objects.append(make(data))
+            except RowError as error:
+                self.skip(position, error)
+        return objects
+
+    def lookup(self, mapping: dict, key: str, label: str):
+        try:
+            return mapping[key]
+        except KeyError:
+            raise RowError(f'{label} {key!r} не найден')
+
+    def import_posts(self, rows) -> int:
+        users = self.resolve_users(
+            str(data.get('author')) for _, data in rows if data.get('author')
+        )
+        groups = dict(
+            Group.objects.filter(slug__in={
+                str(data['group']) for _, data in rows if data.get('group')
+            }).values_list('slug', 'id')
+        )
+        now = timezone.now()
+
+        def make(data):
+            pub_date = parse_date(data.get('pub_date'), now)
+            group = data.get('group')
+            return Post(
+                text=required(data, 'text'),
+                author_id=self.lookup(
+                    users, required(data, 'author'), 'Автор'
+                ),
+                group_id=(
+                    self.lookup(groups, str(group), 'Группа')
+                    if group else None
+                ),
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+        return bulk.create_posts(self.build(rows, make))
+
+    def import_comments(self, rows) -> int:
+        users = self.resolve_users(
+            str(data.get('author')) for _, data in rows if data.get('author')
+        )
+        post_ids = set()
+        for _, data in rows:
+            try:
+                post_ids.add(int(data.get('post')))
+            except (TypeError, ValueError):
+                pass
+        posts = set(
+            Post.objects.filter(id__in=post_ids).values_list('id', flat=True)
+        )
+        now = timezone.now()
+
+        def make(data):
+            try:
+                post_id = int(required(data, 'post'))
+            except ValueError:
+                raise RowError(f'некорректный id поста {data["post"]!r}')
+            if post_id not in posts:
+                raise RowError(f'Пост {post_id} не найден')
+            return Comment(
+                text=required(data, 'text'),
+                author_id=self.lookup(
+                    users, required(data, 'author'), 'Автор'
+                ),
+                post_id=post_id,
+                created=parse_date(data.get('created'), now),
+            )
+        return bulk.create_comments(self.build(rows, make))
+
+    def import_follows(self, rows) -> int:
+        users = self.resolve_users(
+            str(data.get(name))
+            for _, data in rows for name in ('user', 'author')
+            if data.get(name)
+        )
+
+        def make(data):
+            return (
+                self.lookup(users, required(data, 'user'), 'Пользователь'),
+                self.lookup(users, required(data, 'author'), 'Автор'),
+            )
+        return bulk.create_follows(self.build(rows, make))
@@ -0,0 +1,254 @@
+import json
+import platform
+import random
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model,
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from core.loadtest import LoadTest, Request, Visitor
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+DEFAULT_MIX = (
+    'index=30,group_posts=15,profile=15,post_detail=25,'
+    'follow_index=10,add_comment=3,post_create=2'
+)
+# Адреса, которые требуют входа; анонимы выбирают из остальных.
+LOGIN_REQUIRED = {'follow_index', 'add_comment', 'post_create'}
+SAMPLE_SIZE = 1000
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise CommandError(f'Некорректная доля в --mix: {part!r}')
+    unknown = set(mix) - set(Traffic.paths)
+    if unknown:
+        raise CommandError(
+            f'Неизвестные адреса в --mix: {", ".join(sorted(unknown))}'
+        )
+    return mix
+
+
+class Traffic:
+    """Смесь запросов к страницам постов по данным из базы."""
+
+    paths = (
+        'index', 'group_posts', 'profile', 'post_detail',
+        'follow_index', 'add_comment', 'post_create',
+    )
+
+    def __init__(self, mix: dict):
+        # Самые свежие посты: именно их чаще всего и открывают.
+        self.post_ids = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)[:SAMPLE_SIZE]
+        )
+        self.usernames = list(
+            User.objects.filter(posts__id__in=self.post_ids[:100])
+            .values_list('username', flat=True).distinct()
+        )
+        self.slugs = list(
+            Group.objects.values_list('slug', flat=True)[:SAMPLE_SIZE]
+        )
+        if not self.post_ids:
+            raise CommandError(
+                'В базе нет постов; заполните её командой seed.'
+            )
+        available = {
+            'group_posts': bool(self.slugs),
+            'profile': bool(self.usernames),
+        }
+        self.mix = {
+            name: weight for name, weight in mix.items()
+            if weight > 0 and available.get(name, True)
+        }
+
+    def choose(self, rng: random.Random, visitor: Visitor) -> str:
+        names = [
+            name for name in self.mix
+            if visitor.logged_in or name not in LOGIN_REQUIRED
+        ]
+        return rng.choices(names, [self.mix[name] for name in names])[0]
+
+    def __call__(self, rng: random.Random, visitor: Visitor) -> Request:
+        name = self.choose(rng, visitor)
+        post_id = rng.choice(self.post_ids)
+        if name == 'index':
+            page = rng.choice((1, 1, 1, 2, 3))
+            path = reverse('posts:index')
+            return Request(name, 'GET', f'{path}?page={page}')
+        if name == 'group_posts':
+            return Request(name, 'GET', reverse(
+                'posts:group_list', args=(rng.choice(self.slugs),)
+            ))
+        if name == 'profile':
+            return Request(name, 'GET', reverse(
+                'posts:profile', args=(rng.choice(self.usernames),)
+            ))
+        if name == 'post_detail':
+            return Request(name, 'GET', reverse(
+                'posts:post_detail', args=(post_id,)
+            ))
+        if name == 'follow_index':
+            return Request(name, 'GET', reverse('posts:follow_index'))
+        if name == 'add_comment':
+            return Request(
+                name, 'POST', reverse('posts:add_comment', args=(post_id,)),
+                {'text': f'Нагрузочный комментарий {rng.random()}'},
+            )
+        return Request(
+            name, 'POST', reverse('posts:post_create'),
+            {'text': f'Нагрузочный пост {rng.random()}'},
+        )
+
+
+def login_session(user) -> str:
+    """Сессия вошедшего пользователя, как после django.contrib.auth.login."""
+    engine = import_string(f'{settings.SESSION_ENGINE}.SessionStore')
+    session = engine()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает WSGI-приложение из yatube/wsgi.py пулом потоков и '
+        'выводит RPS, p50/p95/p99 и SQL-запросы по каждому адресу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--warmup', type=float, default=2)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int,
+            help='Запросов на поток; без него — до конца --duration.',
+        )
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help='Доли адресов: имя=вес через запятую.',
+        )
+        parser.add_argument(
+            '--logged-in', type=float, default=0.5,
+            help='Доля виртуальных пользователей, вошедших на сайт.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого прогона для сравнения p95.',
+        )
+
+    def handle(self, *args, **options):
+        from yatube.wsgi import application
+
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть положительным.')
+        traffic = Traffic(parse_mix(options['mix']))
+        # Базу сравнения читаем до прогона, чтобы не потерять его
+        # из-за опечатки в пути.
+        baseline = self.load_baseline(options['baseline'])
+        visitors = self.make_visitors(
+            options['concurrency'], options['logged_in'], options['seed']
+        )
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включён: Django хранит каждый SQL-запрос, '
+                'и цифры будут хуже, чем в продакшене.'
+            )
+        # Соединение главного потока не должно жить во время прогона.
+        connection.close()
+        results = LoadTest(
+            application, visitors, traffic, seed=options['seed'],
+        ).run(
+            options['concurrency'], options['duration'],
+            warmup=options['warmup'],
+            requests_per_worker=options['requests'],
+        )
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'options': {
+                name: options[name] for name in (
+                    'duration', 'warmup', 'concurrency', 'requests',
+                    'logged_in', 'seed',
+                )
+            },
+            'mix': traffic.mix,
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+                'debug': settings.DEBUG,
+            },
+            'results': results,
+        }
+        self.print_results(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def make_visitors(self, count: int, logged_in: float, seed: int):
+        rng = random.Random(seed)
+        logged = round(count * min(max(logged_in, 0), 1))
+        # Вошедшие пользователи — те, у кого есть подписки: иначе
+        # лента подписок была бы пустой и ничего не измеряла.
+        user_ids = list(
+            Follow.objects.values_list('user_id', flat=True)
+            .distinct()[:SAMPLE_SIZE]
+        ) or list(User.objects.values_list('id', flat=True)[:SAMPLE_SIZE])
+        if logged and not user_ids:
+            raise CommandError('В базе нет пользователей для входа.')
+        users = User.objects.in_bulk(
+            rng.sample(user_ids, min(logged, len(user_ids)))
+        )
+        visitors = [Visitor(login_session(user)) for user in users.values()]
+        visitors += [Visitor() for _ in range(count - len(visitors))]
+        rng.shuffle(visitors)
+        return visitors
+
+    def load_baseline(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path) as file:
+                return json.load(file).get('results', {})
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать --baseline: {error}')
+        except (ValueError, AttributeError):
+            raise CommandError(f'--baseline {path} — не результаты loadtest.')
+
+    def print_results(self, results: dict, baseline: dict) -> None:
+        self.stdout.write(
+            f'{"адрес":<14}{"запросов":>9}{"ошибок":>8}{"RPS":>9}'
+            f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}{"SQL":>7}'
+        )
+        for name, row in results.items():
+            line = (
+                f'{name:<14}{row["requests"]:>9}{row["errors"]:>8}'
+                f'{row["rps"]:>9.1f}{row["p50_ms"]:>9.1f}'
+                f'{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}'
+                f'{row["queries"]:>7.1f}'
+            )
+            previous = baseline.get(name)
+            if previous and previous.get('p95_ms'):
+                change = row['p95_ms'] / previous['p95_ms'] - 1
+                line += f'  p95 {change:+.0%}'
+            self.stdout.write(line)
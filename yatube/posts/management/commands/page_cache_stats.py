@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import get_page_cache_stats, reset_page_cache_stats
+from posts.views import CACHED_PAGES
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц для анонимов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_page_cache_stats(CACHED_PAGES)
+        total_hits = total_requests = 0
+        for name, counts in stats.items():
+            requests = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / requests if requests else 0
+            total_hits += counts['hit']
+            total_requests += requests
+            self.stdout.write(
+                f'{name:<12} попаданий {counts["hit"]:>8} '
+                f'промахов {counts["miss"]:>8} доля {ratio:7.1%}'
+            )
+        ratio = total_hits / total_requests if total_requests else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего запросов {total_requests}, доля попаданий {ratio:.1%}'
+        ))
+        if options['reset']:
+            reset_page_cache_stats(CACHED_PAGES)
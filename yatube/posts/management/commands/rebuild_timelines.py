@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает домашние ленты пользователей по их подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Имена пользователей; по умолчанию все пользователи.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        total_users = 0
+        total_entries = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            total_entries += timeline.rebuild(user_id)
+            total_users += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано лент: {total_users}, записей: {total_entries}'
+        ))
@@ -0,0 +1,113 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from posts import dumps, timeline
+from posts.bulk import bulk_insert, deferred_indexes
+from posts.cache import bump_feed_version
+from posts.models import AuthorStats, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Восстанавливает группы, посты, комментарии и подписки из дампа '
+        'dump_posts через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с дампом.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Строк в одном bulk_create.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить текущие данные перед загрузкой.',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        try:
+            manifest = dumps.read_manifest(directory)
+        except FileNotFoundError:
+            raise CommandError(f'В {directory} нет {dumps.MANIFEST}.')
+        tables = {table['model']: table for table in manifest['tables']}
+        if not options['clear'] and any(
+            model.objects.exists() for model in dumps.MODELS
+        ):
+            raise CommandError(
+                'Таблицы постов не пусты; используйте --clear.'
+            )
+        tables = [
+            (model, tables[model._meta.label]) for model in dumps.MODELS
+            if model._meta.label in tables
+        ]
+
+        total_rows = 0
+        started = time.monotonic()
+        # Индексы всех таблиц снимаются и строятся заново один раз
+        # на восстановление, а не для каждой модели.
+        with deferred_indexes(
+            {model: table['rows'] for model, table in tables},
+            replace=options['clear'],
+        ):
+            if options['clear']:
+                self.clear()
+            for model, table in tables:
+                table_started = time.monotonic()
+                rows = self.load(
+                    model, directory, table, options['batch_size'],
+                )
+                total_rows += rows
+                self.stdout.write(dumps.throughput(
+                    model._meta.label, rows,
+                    time.monotonic() - table_started,
+                ))
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), dumps.MODELS
+            ):
+                cursor.execute(sql)
+        self.stdout.write(f'Лент собрано: {timeline.rebuild_all()} записей')
+        # Счётчики посчитаются по таблицам при первом чтении.
+        AuthorStats.objects.all().delete()
+        bump_feed_version()
+        self.stdout.write(self.style.SUCCESS(dumps.throughput(
+            'Всего', total_rows, time.monotonic() - started,
+        )))
+
+    def clear(self) -> None:
+        """Очищает таблицы без сбора объектов для каскадного удаления.
+
+        Вызывается внутри deferred_indexes(replace=True): индексы и
+        FTS-индекс постов уже сняты и не обновляются на каждой строке.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in (TimelineEntry, *reversed(dumps.MODELS)):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f'DELETE FROM {table}')
+
+    def load(self, model, directory: str, table: dict,
+             batch_size: int) -> int:
+        rows = 0
+        columns = table['columns']
+        for name in table['files']:
+            records = dumps.read_chunk(os.path.join(directory, name))
+            # Файл дампа — одна транзакция: при сбое загрузку
+            # можно повторить с --clear без половинчатых файлов.
+            with transaction.atomic():
+                while True:
+                    batch = [
+                        model(**{name: row[name] for name in columns})
+                        for row in islice(records, batch_size)
+                    ]
+                    if not batch:
+                        break
+                    bulk_insert(model, batch)
+                    rows += len(batch)
+        return rows
@@ -0,0 +1,313 @@
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import slugify
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from posts import timeline
+from posts.bulk import bulk_insert, deferred_indexes
+from posts.cache import bump_feed_version
+from posts.dumps import throughput
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SENTENCE_POOL = 2000
+WORD_POOL = 500
+# Показатель степенного закона: доля популярных авторов тем больше,
+# чем он меньше. 1.1 даёт «длинный хвост», как у соцсетей.
+ZIPF_EXPONENT = 1.1
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, '
+        'постами, комментариями и подписками для нагрузочных тестов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько постов снабдить сгенерированными картинками.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--until',
+            help='Дата последнего поста (ГГГГ-ММ-ДД); по умолчанию сегодня.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until распределить посты.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--password', default='seed-password',
+            help='Пароль всех созданных пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 and (options['posts'] or options['follows']):
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.options = options
+        self.prefix = f's{options["seed"]}'
+        seeded = User.objects.filter(username__startswith=f'{self.prefix}_')
+        if seeded.exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже есть в базе; '
+                'выберите другой --seed.'
+            )
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.sentences = [
+            self.faker.sentence(nb_words=8) for _ in range(SENTENCE_POOL)
+        ]
+        # Имена пользователей и slug групп должны быть латиницей.
+        self.nicknames = [
+            self.faker.user_name() for _ in range(WORD_POOL)
+        ]
+        until = (
+            parse_date(options['until']) if options['until']
+            else timezone.now().date()
+        )
+        if until is None:
+            raise CommandError('--until ожидает дату ГГГГ-ММ-ДД.')
+        # Даты отсчитываются от полуночи --until, а не от текущего
+        # момента, чтобы повторный запуск с тем же --seed дал те же данные.
+        self.until = timezone.make_aware(
+            datetime.combine(until, datetime.min.time()), timezone.utc,
+        ) + timedelta(days=1)
+        self.span = timedelta(days=options['days']).total_seconds()
+
+        started = time.monotonic()
+        total = 0
+        # Ленты и счётчики пустой базы дешевле собрать целиком.
+        empty = not Follow.objects.exists()
+        with deferred_indexes({
+            Post: options['posts'],
+            Comment: options['comments'],
+            Follow: options['users'] * options['follows'],
+        }):
+            for name, step in (
+                ('Пользователи', self.seed_users),
+                ('Группы', self.seed_groups),
+                ('Посты', self.seed_posts),
+                ('Комментарии', self.seed_comments),
+                ('Подписки', self.seed_follows),
+            ):
+                step_started = time.monotonic()
+                rows = step()
+                total += rows
+                self.stdout.write(
+                    throughput(name, rows, time.monotonic() - step_started)
+                )
+        step_started = time.monotonic()
+        # Посты, комментарии и подписки созданы только новыми
+        # пользователями, поэтому меняются лишь их ленты и счётчики.
+        # Счётчики посчитаются по таблицам при первом чтении.
+        if empty:
+            entries = timeline.rebuild_all()
+            AuthorStats.objects.all().delete()
+        else:
+            entries = timeline.rebuild_many(self.user_ids)
+            if self.user_ids:
+                # id новых пользователей идут подряд после прежних.
+                AuthorStats.objects.filter(
+                    pk__gte=self.user_ids[0]
+                ).delete()
+        self.stdout.write(
+            throughput('Ленты', entries, time.monotonic() - step_started)
+        )
+        bump_feed_version()
+        self.stdout.write(self.style.SUCCESS(
+            throughput('Всего', total, time.monotonic() - started)
+        ))
+
+    def text(self, sentences: int) -> str:
+        return ' '.join(self.random.choices(self.sentences, k=sentences))
+
+    def insert(self, model, rows) -> array:
+        """Вставляет объекты пачками и возвращает id новых строк.
+
+        Даты объектов сохраняются как есть, даже в полях auto_now.
+        """
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        batch = []
+        for obj in rows:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    bulk_insert(model, batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                bulk_insert(model, batch)
+        return array('q', model.objects.filter(id__gt=last_id).order_by('id')
+                     .values_list('id', flat=True).iterator())
+
+    def zipf_weights(self, count: int) -> list:
+        """Накопленные веса 1/rank^s для random.choices."""
+        return list(accumulate(
+            1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)
+        ))
+
+    def seed_users(self) -> int:
+        password = make_password(self.options['password'])
+        self.user_ids = self.insert(User, (
+            User(
+                username=f'{self.prefix}_{self.random.choice(self.nicknames)}'
+                         f'_{i}'[:150],
+                first_name=self.faker.first_name(),
+                last_name=self.faker.last_name(),
+                password=password,
+            )
+            for i in range(self.options['users'])
+        ))
+        # Популярность авторов и их плодовитость не связаны: у каждой
+        # величины своя случайная перестановка пользователей.
+        self.popular = list(self.user_ids)
+        self.random.shuffle(self.popular)
+        self.prolific = list(self.user_ids)
+        self.random.shuffle(self.prolific)
+        self.user_weights = self.zipf_weights(len(self.user_ids))
+        return len(self.user_ids)
+
+    def seed_groups(self) -> int:
+        self.group_ids = self.insert(Group, (
+            Group(
+                title=self.faker.catch_phrase()[:200],
+                slug=f'{self.prefix}-'
+                     f'{slugify(self.random.choice(self.nicknames))}-{i}'[:50],
+                description=self.text(3),
+            )
+            for i in range(self.options['groups'])
+        ))
+        return len(self.group_ids)
+
+    def post_date(self, index: int) -> datetime:
+        """Дата поста растёт вместе с его номером, как в живой базе."""
+        count = self.options['posts']
+        return self.until - timedelta(
+            seconds=self.span * (count - index) / count
+        )
+
+    def seed_posts(self) -> int:
+        count = self.options['posts']
+        images = set(self.random.sample(
+            range(count), min(self.options['images'], count)
+        ))
+
+        def posts():
+            for index in range(count):
+                pub_date = self.post_date(index)
+                group = (
+                    self.random.choice(self.group_ids)
+                    if self.group_ids and self.random.random() < 0.6
+                    else None
+                )
+                yield Post(
+                    text=self.text(self.random.randint(1, 6)),
+                    author_id=self.random.choices(
+                        self.prolific, cum_weights=self.user_weights,
+                    )[0],
+                    group_id=group,
+                    pub_date=pub_date,
+                    updated=pub_date,
+                    image=self.make_image(index) if index in images else '',
+                )
+
+        self.post_ids = self.insert(Post, posts())
+        return len(self.post_ids)
+
+    def make_image(self, index: int) -> str:
+        width, height = settings.POST_IMAGE_SIZE
+        image = Image.new('RGB', (width, height), self.random_color())
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = self.random.randrange(width), self.random.randrange(height)
+            size = self.random.randint(20, height // 2)
+            draw.ellipse(
+                (x - size, y - size, x + size, y + size),
+                fill=self.random_color(),
+            )
+        content = BytesIO()
+        image.save(content, format='JPEG', quality=80)
+        return default_storage.save(
+            f'posts/seed-{self.options["seed"]}-{index}.jpg',
+            ContentFile(content.getvalue()),
+        )
+
+    def random_color(self) -> tuple:
+        return tuple(self.random.randrange(256) for _ in range(3))
+
+    def seed_comments(self) -> int:
+        if not self.post_ids:
+            return 0
+        posts = len(self.post_ids)
+        # Обсуждают в основном немногие посты: номер поста тоже
+        # выбирается по степенному закону.
+        ranks = list(range(posts))
+        self.random.shuffle(ranks)
+        weights = self.zipf_weights(posts)
+
+        def comments():
+            for _ in range(self.options['comments']):
+                index = self.random.choices(ranks, cum_weights=weights)[0]
+                created = min(
+                    self.post_date(index) + timedelta(
+                        seconds=self.random.expovariate(1 / 86400)
+                    ),
+                    self.until,
+                )
+                yield Comment(
+                    post_id=self.post_ids[index],
+                    author_id=self.random.choice(self.user_ids),
+                    text=self.text(self.random.randint(1, 2)),
+                    created=created,
+                )
+
+        return len(self.insert(Comment, comments()))
+
+    def seed_follows(self) -> int:
+        average = self.options['follows']
+        if not average:
+            return 0
+
+        def follows():
+            for user_id in self.user_ids:
+                count = min(
+                    int(self.random.expovariate(1 / average)),
+                    len(self.user_ids) - 1,
+                )
+                authors = set(self.random.choices(
+                    self.popular, cum_weights=self.user_weights, k=count,
+                ))
+                authors.discard(user_id)
+                for author_id in sorted(authors):
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return len(self.insert(Follow, follows()))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import warm_post_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры картинок для уже опубликованных постов.'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        total = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            warm_post_thumbnails(post_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано постов с картинками: {total}'
+        ))
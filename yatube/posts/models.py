@@ -14,6 +14,31 @@ class Group(models.Model):
         return str(self.title)
 
 
+class PostQuerySet(models.QuerySet):
+    """Набор запросов к постам."""
+
+    def for_feed(self) -> 'PostQuerySet':
+        """Посты вместе с автором и группой, без лишних колонок.
+
+        Шаблоны лент обращаются к post.author и post.group.slug
+        у каждого поста, поэтому связи загружаются одним JOIN.
+        """
+        return self.select_related('author', 'group').only(
+            'id',
+            'text',
+            'pub_date',
+            'updated',
+            'image',
+            'author__id',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__id',
+            'group__title',
+            'group__slug',
+        )
+
+
 class Post(models.Model):
     """Модель, описывающая посты пользователей."""
     text = models.TextField(
@@ -24,6 +49,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -45,11 +74,27 @@ class Post(models.Model):
         blank=True,
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self) -> str:
         return str(self.text[:15])
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -78,6 +123,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -94,3 +145,95 @@ class Follow(models.Model):
         related_name='following',
         on_delete=models.CASCADE,
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Модель, описывающая запись домашней ленты пользователя.
+
+    Лента заполняется при публикации поста (fan-out on write),
+    поэтому страница подписок читает один диапазон индекса
+    по пользователю вместо JOIN постов с подписками.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.post_id}'
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Модель, описывающая счётчики активности пользователя.
+
+    Счётчики обновляются атомарно при создании и удалении постов,
+    комментариев и подписок, поэтому страницам не нужно считать
+    строки на каждом запросе.
+    """
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self) -> str:
+        return f'Статистика {self.user_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Модель, описывающая прогресс импорта из файла.
+
+    Позиция сохраняется в той же транзакции, что и пачка строк,
+    поэтому после сбоя импорт продолжается ровно с первой
+    незаписанной строки.
+    """
+    source = models.CharField('Источник', max_length=255, unique=True)
+    rows = models.BigIntegerField('Обработано строк', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    def __str__(self) -> str:
+        return f'{self.source}: {self.rows}'
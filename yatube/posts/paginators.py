@@ -0,0 +1,227 @@
+import base64
+import binascii
+import json
+from typing import Optional, Sequence, Tuple
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest
+from django.utils.dateparse import parse_datetime
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction: str, position: Sequence) -> str:
+    """Упаковывает направление и позицию ключа в непрозрачный токен."""
+    date, pk = position
+    raw = json.dumps([direction, date.isoformat(), pk])
+    token = base64.urlsafe_b64encode(raw.encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, Tuple]]:
+    """Распаковывает токен курсора.
+
+    Для испорченного или пустого токена возвращает None, чтобы
+    страница открылась с начала, как это делает Paginator.get_page().
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, date, pk = json.loads(raw.decode())
+        date = parse_datetime(date)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or date is None:
+        return None
+    if not isinstance(pk, int):
+        return None
+    return direction, (date, pk)
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору, а не по номеру.
+
+    Номера страниц и общее количество записей неизвестны, зато
+    страница знает токены соседних страниц.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            if has_next:
+                self.next_cursor = paginator.cursor_for(
+                    CURSOR_NEXT, object_list[-1],
+                )
+            if has_previous:
+                self.previous_cursor = paginator.cursor_for(
+                    CURSOR_PREVIOUS, object_list[0],
+                )
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    # Номеров у страницы по курсору нет: методы Page возвращают None,
+    # чтобы шаблоны и код, рассчитанные на обычную страницу, не падали.
+    def next_page_number(self):
+        return None
+
+    def previous_page_number(self):
+        return None
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (дата, id) без COUNT и OFFSET.
+
+    Записи выводятся от новых к старым. Каждая страница выбирается
+    одним запросом вида WHERE (date, id) < (...) LIMIT per_page + 1,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 key: Tuple[str, str] = ('pub_date', 'id')):
+        super().__init__(object_list, per_page)
+        self.key = key
+
+    def cursor_for(self, direction: str, obj) -> str:
+        date_field, pk_field = self.key
+        if isinstance(obj, dict):
+            position = (obj[date_field], obj[pk_field])
+        else:
+            position = (getattr(obj, date_field), getattr(obj, pk_field))
+        return encode_cursor(direction, position)
+
+    def _after(self, position) -> Q:
+        date_field, pk_field = self.key
+        date, pk = position
+        return (
+            Q(**{f'{date_field}__lt': date})
+            | Q(**{date_field: date, f'{pk_field}__lt': pk})
+        )
+
+    def _before(self, position) -> Q:
+        date_field, pk_field = self.key
+        date, pk = position
+        return (
+            Q(**{f'{date_field}__gt': date})
+            | Q(**{date_field: date, f'{pk_field}__gt': pk})
+        )
+
+    def cursor_page(self, token: Optional[str]) -> CursorPage:
+        """Возвращает страницу, на которую указывает токен."""
+        date_field, pk_field = self.key
+        cursor = decode_cursor(token)
+        queryset = self.object_list
+        if cursor is None:
+            rows = list(queryset.order_by(
+                f'-{date_field}', f'-{pk_field}',
+            )[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, False)
+
+        direction, position = cursor
+        if direction == CURSOR_NEXT:
+            rows = list(queryset.filter(self._after(position)).order_by(
+                f'-{date_field}', f'-{pk_field}',
+            )[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page], self, has_next, True)
+
+        rows = list(queryset.filter(self._before(position)).order_by(
+            date_field, pk_field,
+        )[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, True, has_previous)
+
+
+class WindowPaginator(Paginator):
+    """Paginator страницы ленты, выбранной по курсору.
+
+    Число страниц известно только вокруг текущей: на одну больше её
+    номера, если дальше есть записи. Этого хватает Page.has_next()
+    и Page.has_previous(), а COUNT(*) не выполняется.
+    """
+
+    def __init__(self, object_list, per_page, num_pages: int):
+        super().__init__(object_list, per_page)
+        self._num_pages = num_pages
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+
+def feed_page(cursor_page: CursorPage, per_page: int) -> Page:
+    """Обычный Page из страницы по курсору для шаблонов лент.
+
+    Первая страница получает номер 1, остальные — 2, поэтому номера
+    годятся только для has_next() и has_previous(); ссылки строятся
+    на курсорах, а by_cursor говорит шаблону не выводить номера.
+    """
+    number = 2 if cursor_page.has_previous() else 1
+    num_pages = number + 1 if cursor_page.has_next() else number
+    page_obj = Page(
+        cursor_page.object_list, number,
+        WindowPaginator(cursor_page.object_list, per_page, num_pages),
+    )
+    page_obj.by_cursor = True
+    page_obj.next_cursor = cursor_page.next_cursor
+    page_obj.previous_cursor = cursor_page.previous_cursor
+    return page_obj
+
+
+def paginate(request: HttpRequest, queryset: QuerySet, per_page: int,
+             key: Tuple[str, str] = ('pub_date', 'id')) -> Page:
+    """Возвращает страницу ленты для запроса.
+
+    Страница выбирается по ключу: первая — без курсора, остальные —
+    по ?cursor=, так что ни COUNT, ни OFFSET не нужны. Обычный
+    Paginator работает только для явного ?page=, чтобы старые ссылки
+    продолжали открываться. Ссылки «вперёд» и «назад» у такой
+    страницы тоже строятся на курсорах.
+    """
+    date_field, pk_field = key
+    queryset = queryset.order_by(f'-{date_field}', f'-{pk_field}')
+    cursors = CursorPaginator(queryset, per_page, key)
+    if 'page' not in request.GET:
+        return feed_page(
+            cursors.cursor_page(request.GET.get('cursor')), per_page,
+        )
+    paginator = Paginator(queryset, per_page)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = list(page_obj.object_list)
+    page_obj.by_cursor = False
+    page_obj.next_cursor = None
+    page_obj.previous_cursor = None
+    if page_obj.object_list and page_obj.has_next():
+        page_obj.next_cursor = cursors.cursor_for(
+            CURSOR_NEXT, page_obj.object_list[-1],
+        )
+    if page_obj.object_list and page_obj.has_previous():
+        page_obj.previous_cursor = cursors.cursor_for(
+            CURSOR_PREVIOUS, page_obj.object_list[0],
+        )
+    return page_obj
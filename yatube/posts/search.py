@@ -0,0 +1,145 @@
+import re
+from typing import List
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+# Внешнее содержимое: FTS-индекс хранит только токены, а текст
+# читается из posts_post по rowid = posts_post.id.
+CREATE_FTS_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+CREATE_FTS_TRIGGERS = (
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai '
+    'AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+    'END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad '
+    'AFTER DELETE ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au '
+    'AFTER UPDATE OF text ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+    "VALUES ('delete', old.id, old.text); "
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+    'END',
+)
+DROP_FTS = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+REBUILD_FTS = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def install_search_index(schema_editor) -> None:
+    """Создаёт FTS5-индекс постов и триггеры синхронизации.
+
+    Вызывается из миграций. SQLite при изменении схемы пересоздаёт
+    таблицу posts_post и теряет её триггеры, поэтому миграции,
+    которые её меняют, должны вызвать эту функцию повторно.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS_TABLE)
+    for statement in CREATE_FTS_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(REBUILD_FTS)
+
+
+def uninstall_search_index(schema_editor) -> None:
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS:
+        schema_editor.execute(statement)
+
+
+def fts_enabled() -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text: str) -> str:
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки, чтобы символы синтаксиса FTS5
+    (NEAR, *, ^, двоеточия) не ломали запрос. Слова объединяются
+    через AND.
+    """
+    return ' '.join(f'"{word}"' for word in WORD_RE.findall(text))
+
+
+class SearchResults:
+    """Ленивая выборка результатов поиска, отсортированных по bm25.
+
+    Объект понимает count() и срезы, поэтому его можно отдать
+    обычному Paginator: каждая страница — один запрос к FTS-индексу
+    с LIMIT/OFFSET и один запрос постов по id.
+    """
+
+    def __init__(self, text: str):
+        self.match = build_match_query(text)
+        self.text = text
+
+    def count(self) -> int:
+        if not self.match:
+            return 0
+        if not fts_enabled():
+            return Post.objects.filter(text__icontains=self.text).count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def _ids(self, offset: int, limit: int) -> List[int]:
+        if not fts_enabled():
+            return list(
+                Post.objects
+                .filter(text__icontains=self.text)
+                .order_by('-pub_date', '-id')
+                .values_list('id', flat=True)[offset:offset + limit]
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{MATCH_SQL} ORDER BY rank LIMIT %s OFFSET %s',
+                [self.match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.match:
+            return []
+        offset = key.start or 0
+        ids = self._ids(offset, key.stop - offset)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def filter_by_text(queryset, text: str):
+    """Оставляет в queryset посты, подходящие под поисковый запрос."""
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+    if not fts_enabled():
+        return queryset.filter(text__icontains=text)
+    return queryset.filter(pk__in=RawSQL(MATCH_SQL, [match]))
@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import stats, timeline
+from .cache import bump_comments_version, bump_feed_version
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Дополняет ленту постами автора после подписки."""
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Убирает посты автора из ленты после отписки."""
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def invalidate_feed_cache(sender, **kwargs):
+    """Сбрасывает кэш лент при изменении постов, групп и авторов."""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_page_cache(sender, instance, **kwargs):
+    """Сбрасывает кэш страницы поста при изменении комментариев."""
+    bump_comments_version(instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_feed_cache_on_user_change(sender, update_fields=None,
+                                         **kwargs):
+    """Сбрасывает кэш лент при изменении пользователя.
+
+    Вход на сайт сохраняет только last_login, который в лентах
+    не выводится, поэтому такие сохранения кэш не трогают.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_feed_version()
+
+
+@receiver(post_save, sender=User)
+def touch_author_posts(sender, instance, created, update_fields=None,
+                       **kwargs):
+    """Сдвигает updated у постов автора, чтобы сбросить их карточки."""
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+    Post.objects.filter(author=instance).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def touch_group_posts(sender, instance, **kwargs):
+    """Сдвигает updated у постов группы, чтобы сбросить их карточки."""
+    Post.objects.filter(group=instance).update(updated=timezone.now())
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, followers_count=1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.author_id, followers_count=-1)
+    stats.change(instance.user_id, following_count=-1)
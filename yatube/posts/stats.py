@@ -0,0 +1,68 @@
+from collections import defaultdict
+from typing import Dict
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import AuthorStats, Comment, Follow, Post
+
+
+def count_stats(user_id: int) -> dict:
+    """Считает счётчики пользователя по таблицам."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'comments_count': Comment.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def get_author_stats(user_id: int) -> AuthorStats:
+    """Возвращает счётчики пользователя одним запросом по ключу.
+
+    Если записи ещё нет, она создаётся по фактическим данным.
+    """
+    try:
+        return AuthorStats.objects.get(pk=user_id)
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(
+            pk=user_id,
+            defaults=count_stats(user_id),
+        )
+        return stats
+
+
+def recount(user_id: int) -> AuthorStats:
+    """Пересчитывает счётчики пользователя заново."""
+    stats, _ = AuthorStats.objects.update_or_create(
+        pk=user_id,
+        defaults=count_stats(user_id),
+    )
+    return stats
+
+
+def change(user_id: int, **deltas: int) -> None:
+    """Атомарно сдвигает счётчики пользователя на заданные величины.
+
+    Записи, которых ещё нет, не создаются: при первом чтении
+    они будут посчитаны по таблицам.
+    """
+    AuthorStats.objects.filter(pk=user_id).update(**{
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    })
+
+
+def change_many(field: str, deltas: Dict[int, int]) -> None:
+    """Сдвигает один счётчик у многих пользователей сразу.
+
+    Пользователи с одинаковым сдвигом обновляются одним запросом,
+    поэтому пачка из тысячи постов стоит несколько UPDATE, а не тысячу.
+    """
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        users_by_delta[delta].append(user_id)
+    for delta, user_ids in users_by_delta.items():
+        AuthorStats.objects.filter(pk__in=user_ids).update(**{
+            field: Greatest(F(field) + delta, Value(0)),
+        })
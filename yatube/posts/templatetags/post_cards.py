@@ -0,0 +1,11 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, variant='feed'):
+    """Готовые карточки постов страницы, см. posts.cards.render_cards."""
+    return render_cards(posts, variant)
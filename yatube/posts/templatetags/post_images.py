@@ -0,0 +1,45 @@
+import logging
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from ..thumbnails import CONTENT_TYPES, image_variants
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    """Адаптивная картинка поста: WebP в srcset и запасной JPEG."""
+    if not post.image:
+        return {'sources': []}
+    srcsets = {}
+    fallback = None
+    try:
+        for width, geometry, options in image_variants():
+            thumbnail = get_thumbnail(post.image, geometry, **options)
+            srcsets.setdefault(options['format'], []).append(
+                f'{thumbnail.url} {width}w'
+            )
+            if options['format'] == 'JPEG':
+                fallback = thumbnail
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', post.image)
+        return {'sources': []}
+    sources = [
+        {'type': CONTENT_TYPES[image_format], 'srcset': ', '.join(srcset)}
+        for image_format, srcset in srcsets.items()
+        if image_format != 'JPEG'
+    ]
+    width, height = settings.POST_IMAGE_SIZE
+    return {
+        'sources': sources,
+        'fallback': fallback,
+        'fallback_srcset': ', '.join(srcsets.get('JPEG', [])),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': width,
+        'height': height,
+    }
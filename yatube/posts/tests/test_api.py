@@ -0,0 +1,204 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class PostsApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        for i in range(25):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+        cls.post = Post.objects.latest('pub_date', 'id')
+
+    def setUp(self) -> None:
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_posts_cursor_pagination(self):
+        """Лента постов листается курсором без повторов."""
+        url = reverse('api:posts')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertIsNone(first['previous_cursor'])
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next_cursor'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 25)
+        self.assertEqual(first['results'][0]['author'], 'Author')
+
+    def test_posts_filter_by_group(self):
+        """Фильтр ?group= отдаёт только посты группы."""
+        response = self.client.get(
+            reverse('api:posts'), {'group': 'test-slug', 'limit': 100}
+        )
+        results = response.json()['results']
+        self.assertEqual(len(results), 12)
+        self.assertEqual({post['group'] for post in results}, {'test-slug'})
+
+    def test_sparse_fieldsets(self):
+        """?fields= ограничивает поля ответа."""
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,text'}
+        )
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'}
+        )
+        response = self.client.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json()['errors'])
+
+    def test_posts_bulk(self):
+        """Посты по списку id отдаются в порядке запроса."""
+        ids = list(Post.objects.values_list('id', flat=True)[:3])
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('api:posts_bulk'),
+                {'ids': ','.join(map(str, [*reversed(ids), 0]))},
+            )
+        data = response.json()
+        self.assertEqual(
+            [post['id'] for post in data['results']], list(reversed(ids))
+        )
+        self.assertEqual(data['missing'], [0])
+
+    def test_etag(self):
+        """Повторный запрос с If-None-Match получает 304."""
+        url = reverse('api:post', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['id'], self.post.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_create_and_edit_post(self):
+        """Пост создаёт пользователь, а меняет только автор."""
+        url = reverse('api:posts')
+        self.assertEqual(
+            self.send(self.client, 'post', url, {'text': 'Новый'}).status_code,
+            401,
+        )
+        response = self.send(
+            self.author_client, 'post', url,
+            {'text': 'Новый пост', 'group': 'test-slug'},
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['group'], 'test-slug')
+        post_url = reverse('api:post', kwargs={'post_id': created['id']})
+        response = self.send(
+            self.reader_client, 'patch', post_url, {'text': 'Чужая правка'}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.send(
+            self.author_client, 'patch', post_url, {'text': 'Правка'}
+        )
+        self.assertEqual(response.json()['text'], 'Правка')
+        self.assertEqual(response.json()['group'], 'test-slug')
+        response = self.send(
+            self.author_client, 'patch', post_url, {'group': 'missing'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('group', response.json()['errors'])
+
+    def test_nested_json_values_rejected(self):
+        """Списки и объекты в полях JSON отклоняются с кодом 400."""
+        response = self.send(
+            self.author_client, 'post', reverse('api:posts'),
+            {'text': ['Новый пост'], 'group': {'slug': 'test-slug'}},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json()['errors']), {'text', 'group'}
+        )
+
+    def test_csrf_failure_is_json(self):
+        """Запрос без CSRF-токена получает JSON с кодом 403."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = self.send(
+            client, 'post', reverse('api:posts'), {'text': 'Новый пост'}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['detail'])
+        self.assertFalse(Post.objects.filter(text='Новый пост').exists())
+        client.get(reverse('posts:post_create'))
+        response = client.post(
+            reverse('api:posts'), json.dumps({'text': 'Новый пост'}),
+            content_type='application/json',
+            HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value,
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_comments(self):
+        """Комментарии к посту читаются и добавляются через API."""
+        url = reverse('api:post_comments', kwargs={'post_id': self.post.pk})
+        response = self.send(
+            self.reader_client, 'post', url, {'text': 'Комментарий'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Comment.objects.filter(
+            post=self.post, author=self.reader, text='Комментарий'
+        ).exists())
+        results = self.client.get(url).json()['results']
+        self.assertEqual(results[0]['author'], 'Reader')
+        response = self.client.get(
+            reverse('api:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_groups(self):
+        """Группы доступны списком и по slug."""
+        results = self.client.get(reverse('api:groups')).json()['results']
+        self.assertEqual(results[0]['slug'], 'test-slug')
+        response = self.client.get(
+            reverse('api:group', kwargs={'slug': 'test-slug'})
+        )
+        self.assertEqual(response.json()['title'], 'Тестовый заголовок')
+
+    def test_follows(self):
+        """Подписка и отписка через API."""
+        url = reverse('api:follows')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.send(
+            self.reader_client, 'post', url, {'author': 'Author'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        results = self.reader_client.get(url).json()['results']
+        self.assertEqual(results[0]['author'], 'Author')
+        response = self.send(
+            self.reader_client, 'post', url, {'author': 'Reader'}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.reader_client.delete(
+            reverse('api:follow', kwargs={'username': 'Author'})
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
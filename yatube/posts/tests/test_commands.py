@@ -0,0 +1,349 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .. import bulk
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..search import SearchResults
+from ..stats import get_author_stats
+
+
+class ImportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_jsonl(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(
+                    row if isinstance(row, str) else json.dumps(row)
+                )
+                file.write('\n')
+        return path
+
+    def import_content(self, *args, **kwargs):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_content', *args, stdout=out, stderr=err, **kwargs
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_posts(self):
+        """Посты импортируются с датами, лентами и счётчиками."""
+        path = self.write_jsonl('posts.jsonl', [
+            {
+                'author': 'Author', 'text': 'Старый пост',
+                'group': 'test-slug', 'pub_date': '2020-01-02T03:04:05',
+            },
+            {'author': 'Author', 'text': 'Новый пост'},
+            {'author': 'Nobody', 'text': 'Без автора'},
+            'не JSON',
+        ])
+        out, err = self.import_content('posts', path, batch_size=2)
+        self.assertIn('записано 2', out)
+        self.assertIn('пропущено 2', out)
+        self.assertIn('Строка 3 пропущена', err)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            post.pub_date,
+            timezone.make_aware(datetime(2020, 1, 2, 3, 4, 5), timezone.utc),
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(get_author_stats(self.author.pk).posts_count, 2)
+
+    def test_import_resumes_after_failure(self):
+        """После сбоя --resume дописывает только оставшиеся строки."""
+        path = self.write_jsonl('posts.jsonl', [
+            {'author': 'Author', 'text': f'Пост {i}'} for i in range(5)
+        ])
+        create_posts = bulk.create_posts
+        calls = []
+
+        def failing(posts):
+            calls.append(posts)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return create_posts(posts)
+
+        with mock.patch.object(bulk, 'create_posts', failing):
+            with self.assertRaises(RuntimeError):
+                self.import_content('posts', path, batch_size=2)
+        self.assertEqual(Post.objects.count(), 2)
+        out, _ = self.import_content(
+            'posts', path, batch_size=2, resume=True
+        )
+        self.assertIn('Продолжение со строки 3', out)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {i}' for i in range(5)],
+        )
+
+    def test_import_comments_and_follows_from_csv(self):
+        """Комментарии и подписки импортируются из CSV."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        comments = os.path.join(self.directory, 'comments.csv')
+        with open(comments, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['post', 'author', 'text'])
+            writer.writerow([post.pk, 'Reader', 'Комментарий, с запятой'])
+            writer.writerow([0, 'Reader', 'К несуществующему посту'])
+        out, _ = self.import_content('comments', comments)
+        self.assertIn('записано 1', out)
+        self.assertEqual(
+            Comment.objects.get(post=post).text, 'Комментарий, с запятой'
+        )
+
+        follows = self.write_jsonl('follows.jsonl', [
+            {'user': 'Author', 'author': 'Reader'},
+            {'user': 'Reader', 'author': 'Author'},
+            {'user': 'Newcomer', 'author': 'Author'},
+        ])
+        out, _ = self.import_content('follows', follows, create_users=True)
+        self.assertIn('записано 2', out)
+        newcomer = User.objects.get(username='Newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=newcomer, post=post).exists()
+        )
+        self.assertEqual(
+            get_author_stats(self.author.pk).followers_count, 2
+        )
+
+
+# Загрузка снимает индексы редактором схемы, а SQLite не даёт
+# открыть его внутри транзакции TestCase.
+class DumpRestoreTests(TransactionTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create_user(username='Author')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}', author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return [
+            list(model.objects.order_by('pk').values())
+            for model in (Group, Post, Comment, Follow)
+        ]
+
+    def test_dump_and_restore(self):
+        """Дамп восстанавливается с теми же id, датами и лентами."""
+        before = self.snapshot()
+        path = os.path.join(self.directory, 'dump')
+        out = StringIO()
+        call_command('dump_posts', path, rows_per_file=2, stdout=out)
+        self.assertIn('posts.Post: 5 строк', out.getvalue())
+        self.assertIn('post-00003.jsonl.gz', os.listdir(path))
+
+        with self.assertRaisesMessage(CommandError, '--clear'):
+            call_command('restore_posts', path, stdout=StringIO())
+        out = StringIO()
+        schema_editor = connection.schema_editor
+        # Индексы снимаются и строятся один раз на всё восстановление:
+        # каждый редактор схемы SQLite проверяет внешние ключи всей базы.
+        with mock.patch.object(
+            connection, 'schema_editor', side_effect=schema_editor,
+        ) as editors:
+            call_command('restore_posts', path, clear=True, stdout=out)
+        self.assertEqual(editors.call_count, 2)
+        self.assertIn('Всего: 12 строк', out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertEqual(get_author_stats(self.author.pk).posts_count, 5)
+        self.assertEqual(SearchResults('текст 3').count(), 1)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table,
+            )
+        for index in Post._meta.indexes:
+            self.assertIn(index.name, constraints)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertGreater(post.pk, max(row['id'] for row in before[1]))
+
+
+class SeedTests(TransactionTestCase):
+    def seed(self, **options):
+        call_command(
+            'seed', users=30, groups=3, posts=60, comments=90, follows=5,
+            seed=7, until='2026-01-01', stdout=StringIO(), **options
+        )
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('username').values_list(
+                'username', 'first_name',
+            )),
+            list(Post.objects.order_by('pub_date').values_list(
+                'text', 'author__username', 'group__slug', 'pub_date',
+            )),
+            list(Comment.objects.order_by('created', 'text').values_list(
+                'text', 'author__username', 'post__pub_date', 'created',
+            )),
+            sorted(Follow.objects.values_list(
+                'user__username', 'author__username',
+            )),
+        )
+
+    def test_seed_is_deterministic(self):
+        """Один и тот же --seed даёт одни и те же данные."""
+        self.seed()
+        first = self.snapshot()
+        self.assertEqual(len(first[1]), 60)
+        self.assertEqual(len(first[2]), 90)
+        self.assertTrue(all(
+            created >= pub_date for _, _, pub_date, created in first[2]
+        ))
+        with self.assertRaisesMessage(CommandError, '--seed 7'):
+            self.seed()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_additive_seed_touches_only_new_data(self):
+        """Небольшой повторный прогон не пересобирает чужие ленты и индексы."""
+        self.seed()
+        entries = TimelineEntry.objects.count()
+        with mock.patch('posts.timeline.rebuild_all') as rebuild_all, \
+                mock.patch.object(connection, 'schema_editor') as editor:
+            call_command(
+                'seed', users=10, groups=1, posts=10, comments=10,
+                follows=2, seed=8, until='2026-01-01', stdout=StringIO(),
+            )
+        rebuild_all.assert_not_called()
+        editor.assert_not_called()
+        self.assertGreater(TimelineEntry.objects.count(), entries)
+        self.assertEqual(Post.objects.count(), 70)
+        follow = Follow.objects.order_by('-id').first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=follow.user_id).count(),
+            Post.objects.filter(
+                author__following__user_id=follow.user_id
+            ).count(),
+        )
+
+    def test_seed_builds_timelines(self):
+        """После генерации ленты и счётчики соответствуют подпискам."""
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media):
+            self.seed(images=2)
+        self.assertEqual(Post.objects.exclude(image='').count(), 2)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=follow.user_id).count(),
+            Post.objects.filter(
+                author__following__user_id=follow.user_id
+            ).count(),
+        )
+        author = Post.objects.first().author_id
+        self.assertEqual(
+            get_author_stats(author).posts_count,
+            Post.objects.filter(author_id=author).count(),
+        )
+
+
+class LoadTestTests(TransactionTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        author = User.objects.create_user(username='Author')
+        reader = User.objects.create_user(username='Reader')
+        group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        for i in range(5):
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=author, group=group
+            )
+        Follow.objects.create(user=reader, author=author)
+
+    def test_loadtest_writes_results(self):
+        """Прогон пишет задержки и SQL по адресам и сравнивает с базой."""
+        output = os.path.join(self.directory, 'results.json')
+        out = StringIO()
+        call_command(
+            'loadtest', duration=30, warmup=0, concurrency=2, requests=20,
+            logged_in=0.5, output=output, stdout=out, stderr=StringIO(),
+        )
+        with open(output) as file:
+            report = json.load(file)
+        results = report['results']
+        self.assertEqual(results['*']['requests'], 40)
+        self.assertEqual(results['*']['errors'], 0)
+        self.assertNotIn('403', results['*']['statuses'])
+        self.assertIn('post_detail', results)
+        self.assertGreater(results['post_detail']['queries'], 0)
+        self.assertEqual(
+            set(results['*']),
+            {
+                'requests', 'errors', 'statuses', 'rps', 'p50_ms',
+                'p95_ms', 'p99_ms', 'max_ms', 'queries',
+            },
+        )
+        out = StringIO()
+        call_command(
+            'loadtest', duration=30, warmup=0, concurrency=1, requests=5,
+            mix='index=1', baseline=output, stdout=out, stderr=StringIO(),
+        )
+        self.assertIn('p95 ', out.getvalue())
+
+    def test_loadtest_rejects_missing_baseline(self):
+        missing = os.path.join(self.directory, 'missing.json')
+        with self.assertRaisesMessage(CommandError, '--baseline'):
+            call_command(
+                'loadtest', warmup=0, concurrency=1, requests=1,
+                baseline=missing, stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def test_loadtest_rejects_unknown_mix(self):
+        with self.assertRaisesMessage(CommandError, 'nowhere'):
+            call_command('loadtest', mix='index=1,nowhere=2')
@@ -1,15 +1,30 @@
 import tempfile
 import shutil
+from io import BytesIO
+from unittest import mock
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail import default
+from PIL import Image
 
+from .. import images
 from ..models import Post, Group, User, Comment
+from ..thumbnails import image_variants
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -46,17 +61,9 @@ class PostFormTests(TestCase):
 
     def test_create_post(self):
         """Валидная форма создает запись в Post."""
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         posts_count = Post.objects.count()
@@ -81,6 +88,52 @@ class PostFormTests(TestCase):
         self.assertEqual(self.group, new_post.group)
         self.assertEqual('posts/small.gif', new_post.image.name)
 
+    @override_settings(BACKGROUND_JOBS_EAGER=True)
+    def test_create_post_warms_thumbnails(self):
+        """После загрузки картинки миниатюры создаются заранее."""
+        default.kvstore.clear()
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Запись с картинкой', 'image': uploaded},
+        )
+        new_post = Post.objects.get(text='Запись с картинкой')
+        # Готовая миниатюра отдаётся без повторного декодирования оригинала.
+        with mock.patch.object(
+            default.engine, 'get_image', side_effect=AssertionError
+        ):
+            for _, geometry, options in image_variants():
+                with self.subTest(geometry=geometry, **options):
+                    thumbnail = get_thumbnail(
+                        new_post.image, geometry, **options
+                    )
+                    self.assertTrue(thumbnail.exists())
+
+    def test_post_image_srcset(self):
+        """Картинка поста отдаётся в WebP и JPEG нескольких ширин."""
+        uploaded = SimpleUploadedFile(
+            name='srcset.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        post = Post.objects.create(
+            text='Адаптивная картинка',
+            author=self.author,
+            image=uploaded,
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w', count=2)
+
     def test_edit_post(self):
         """Тестирование формы редактирования поста"""
         initial_text = self.post.text
@@ -146,3 +199,120 @@ class PostFormTests(TestCase):
             comment_count,
             Comment.objects.filter(post_id=1).count()
         )
+
+
+def make_jpeg(size, orientation=None, image_format='JPEG'):
+    """JPEG заданного размера, при необходимости с EXIF-ориентацией."""
+    image = Image.new('RGB', size, 'white')
+    exif = image.getexif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_DIMENSIONS=(64, 64),
+    POST_IMAGE_MAX_PIXELS=200 * 200,
+)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def upload(self, name, content):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': name,
+                'image': SimpleUploadedFile(
+                    name=name, content=content, content_type='image/jpeg'
+                ),
+            },
+        )
+
+    def test_large_image_downsized_without_exif(self):
+        """Большая картинка уменьшается, поворачивается и теряет EXIF."""
+        self.upload('large.jpg', make_jpeg((160, 100), orientation=6))
+        post = Post.objects.get(text='large.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (40, 64))
+            self.assertFalse(image.getexif())
+
+    def test_small_image_stored_as_is(self):
+        """Картинка в пределах лимитов без EXIF не перекодируется."""
+        self.upload('small.gif', SMALL_GIF)
+        post = Post.objects.get(text='small.gif')
+        with post.image.open('rb') as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше POST_IMAGE_MAX_PIXELS отклоняется формой."""
+        posts_count = Post.objects.count()
+        content = make_jpeg((300, 200))
+        with mock.patch.object(
+            Image.Image, 'load', side_effect=AssertionError
+        ):
+            response = self.upload('bomb.jpg', content)
+        self.assertFormError(
+            response, 'form', 'image', 'Изображение 300x200 слишком большое.'
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(POST_IMAGE_MAX_DIMENSIONS=(80, 40))
+    def test_rotated_image_fits_non_square_limit(self):
+        """Лимит применяется к картинке, уже повёрнутой по EXIF."""
+        self.upload('rotated.jpg', make_jpeg((160, 100), orientation=6))
+        post = Post.objects.get(text='rotated.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (25, 40))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS_FULL_DECODE=100 * 100)
+    def test_full_decode_formats_have_lower_pixel_limit(self):
+        """PNG и WebP без уменьшения при декодировании ограничены сильнее."""
+        for image_format in ('PNG', 'WEBP'):
+            with self.subTest(image_format=image_format):
+                response = self.upload(
+                    f'large.{image_format.lower()}',
+                    make_jpeg((150, 100), image_format=image_format),
+                )
+                self.assertFormError(
+                    response, 'form', 'image',
+                    'Изображение 150x100 слишком большое.',
+                )
+        self.upload('large.jpg', make_jpeg((150, 100)))
+        self.assertTrue(Post.objects.filter(text='large.jpg').exists())
+
+    def test_processed_images_closed(self):
+        """Закрываются и оригинал, и повёрнутая копия."""
+        opened, closed = [], []
+        check_image = images.check_image
+        close = Image.Image.close
+
+        def tracking_check_image(uploaded):
+            opened.append(check_image(uploaded))
+            return opened[-1]
+
+        def tracking_close(image):
+            closed.append(image)
+            close(image)
+
+        with mock.patch.object(images, 'check_image', tracking_check_image), \
+                mock.patch.object(Image.Image, 'close', tracking_close):
+            images.process_image(SimpleUploadedFile(
+                'closed.jpg', make_jpeg((160, 100), orientation=6),
+            ))
+        self.assertTrue(any(image is opened[0] for image in closed))
+        self.assertGreater(len(closed), 1)
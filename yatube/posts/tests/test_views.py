@@ -1,18 +1,31 @@
+from datetime import timedelta
+from io import StringIO
 from itertools import islice
 import tempfile
 import shutil
+from unittest import mock
 
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from ..models import Post, Group, User, Comment, Follow
+from .. import cards
+from ..cache import get_feed_version
+from ..models import Post, Group, User, Comment, Follow, TimelineEntry
+from ..stats import get_author_stats
 from ..views import (POSTS_ON_INDEX_PAGE,
                      POSTS_ON_GROUP_POSTS_PAGE,
                      POSTS_ON_PROFILE_PAGE,
+                     POSTS_ON_SEARCH_PAGE,
+                     COMMENTS_ON_POST_PAGE,
                      )
 
 NUMBER_OF_POSTS_FROM_AUTHOR_WITH_FIRST_GROUP = 13
@@ -244,6 +257,59 @@ class PostPagesTests(TestCase):
             kwargs={'username': 'Author'}) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 4)
 
+    def test_cursor_pagination_on_feed_pages(self):
+        """Проверяем переход по курсорам вперёд и назад на страницах лент."""
+        feed_urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+        )
+        for url in feed_urls:
+            with self.subTest(url=url):
+                first_page = self.client.get(url).context['page_obj']
+                response = self.client.get(
+                    url, {'cursor': first_page.next_cursor}
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), 4)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertTrue(second_page.by_cursor)
+                self.assertEqual(
+                    second_page[0].pk,
+                    self.client.get(url, {'page': 2}).context['page_obj'][0].pk
+                )
+                response = self.client.get(
+                    url, {'cursor': second_page.previous_cursor}
+                )
+                previous_page = response.context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in previous_page],
+                    [post.pk for post in first_page],
+                )
+                self.assertFalse(previous_page.has_previous())
+
+    def test_feed_landing_page_uses_cursor(self):
+        """Первая страница ленты выбирается по ключу, без номеров."""
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.by_cursor)
+        self.assertTrue(page_obj.has_next())
+        self.assertFalse(page_obj.has_previous())
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertNotContains(response, 'page=')
+        self.assertNotContains(response, 'Последняя')
+
+    def test_invalid_cursor_opens_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), POSTS_ON_INDEX_PAGE
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
     def test_new_post_on_another_group_page(self):
         """Проверяем,что на странице группы first_group
         не появляются посты second_group
@@ -287,14 +353,41 @@ class PostPagesTests(TestCase):
         """Тестирование корректной работы кэширования."""
         response = self.authorized_client.get(reverse('posts:index'))
         cache_check = response.content
-        post = Post.objects.get(pk=14)
-        post.delete()
+        Post.objects.filter(pk=14).update(text='Изменено в обход сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, cache_check)
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, cache_check)
 
+    def test_index_cache_invalidated_by_changes(self):
+        """Кэш главной страницы сбрасывается при изменении данных."""
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.get(pk=14).delete()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'href="/posts/14/"')
+        changes = {
+            'post_create': lambda: Post.objects.create(
+                text='Новый пост', author=self.author,
+            ),
+            'post_edit': lambda: Post.objects.get(pk=1).save(),
+            'group_edit': lambda: self.first_group.save(),
+            'author_edit': lambda: self.author.save(),
+        }
+        for change, apply_change in changes.items():
+            with self.subTest(change=change):
+                version = get_feed_version()
+                apply_change()
+                self.assertNotEqual(version, get_feed_version())
+
+    def test_login_does_not_invalidate_index_cache(self):
+        """Вход пользователя не сбрасывает кэш главной страницы."""
+        self.user.set_password('password')
+        self.user.save()
+        version = get_feed_version()
+        self.client.login(username='NoName', password='password')
+        self.assertEqual(version, get_feed_version())
+
     def test_correct_follow_and_unfollow(self):
         """Проверяем, что подписка и отписка работают корректно."""
         follow_count = Follow.objects.filter(
@@ -337,6 +430,43 @@ class PostPagesTests(TestCase):
         last_post = response.context['page_obj'][0].text
         self.assertEqual('Тестируем follow_index_page', last_post)
 
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленту подписок."""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            len(response.context['page_obj']),
+            POSTS_ON_INDEX_PAGE,
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(),
+            NUMBER_OF_ALL_CREATED_POSTS,
+        )
+
+    def test_follow_index_skips_deleted_posts(self):
+        """Пост, удалённый после чтения ленты, не ломает страницу."""
+        Follow.objects.create(user=self.user, author=self.author)
+        deleted = Post.objects.filter(author=self.author).latest('pub_date')
+        in_bulk = Post.objects.for_feed().in_bulk
+
+        def in_bulk_without_deleted(self, ids):
+            return {
+                pk: post for pk, post in in_bulk(ids).items()
+                if pk != deleted.pk
+            }
+
+        with mock.patch('django.db.models.query.QuerySet.in_bulk',
+                        in_bulk_without_deleted):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(len(page), POSTS_ON_INDEX_PAGE - 1)
+        self.assertNotIn(deleted, page.object_list)
+
     def test_unauthorized_client_cannot_follow(self):
         """Тестируем, что неавторизованный пользователь
          не может подписаться
@@ -349,3 +479,541 @@ class PostPagesTests(TestCase):
             response,
             '/auth/login/?next=%2Fprofile%2FAuthor%2Ffollow%2F'
         )
+
+
+class PostFeedQueriesTests(TestCase):
+    """Проверяем, что число запросов на лентах не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        for i in range(POSTS_ON_INDEX_PAGE):
+            author = User.objects.create_user(username=f'Author{i}')
+            group = Group.objects.create(
+                title=f'Тестовый заголовок {i}',
+                description='Тестовый текст',
+                slug=f'test-slug-{i}',
+            )
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=author,
+                group=group,
+            )
+            Post.objects.create(
+                text=f'Тестовый текст автора {i}',
+                author=cls.author,
+                group=cls.group,
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+        get_author_stats(cls.author.pk)
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_pages_query_count(self):
+        """Посты на лентах загружаются вместе с авторами и группами."""
+        feed_pages = {
+            reverse('posts:index'): (self.client, 1),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): (
+                self.client, 2
+            ),
+            reverse('posts:profile', kwargs={'username': 'Author'}): (
+                self.client, 3
+            ),
+            reverse('posts:follow_index'): (self.authorized_client, 4),
+        }
+        for url, (client, queries) in feed_pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    POSTS_ON_INDEX_PAGE,
+                )
+
+    def test_profile_loads_author_once(self):
+        """Автор профиля читается из базы один раз за запрос."""
+        url = reverse('posts:profile', kwargs={'username': 'Author'})
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        user_queries = [
+            query['sql'] for query in queries
+            if 'FROM "auth_user"' in query['sql']
+        ]
+        # Текущий пользователь из сессии и автор профиля.
+        self.assertEqual(len(user_queries), 2)
+
+    def test_profile_checks_following_once(self):
+        """Подписка читается один раз на свежесть и страницу профиля."""
+        url = reverse('posts:profile', kwargs={'username': 'Author0'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        follow_queries = [
+            query['sql'] for query in queries
+            if 'FROM "posts_follow"' in query['sql']
+            and '"posts_follow"."user_id" = ' in query['sql']
+            and '"posts_follow"."author_id" = ' in query['sql']
+        ]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertTrue(response.context['following'])
+
+    def test_post_edit_does_not_reload_user(self):
+        """Права на правку проверяются без повторного чтения автора."""
+        post = Post.objects.filter(author=self.author).first()
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:post_edit', kwargs={'post_id': post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        user_queries = [
+            query['sql'] for query in queries
+            if 'FROM "auth_user"' in query['sql']
+        ]
+        # Только текущий пользователь из сессии.
+        self.assertEqual(len(user_queries), 1)
+
+    def test_post_detail_comment_authors_batched(self):
+        """Авторы комментариев загружаются вместе с комментариями."""
+        post = Post.objects.filter(author=self.author).first()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        Comment.objects.create(post=post, author=self.author, text='Первый')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for i in range(3):
+            Comment.objects.create(
+                post=post,
+                author=User.objects.get(username=f'Author{i}'),
+                text=f'Комментарий {i}',
+            )
+        cache.clear()
+        # Число запросов не зависит от числа авторов комментариев.
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertContains(response, 'Author2')
+
+    def test_view_queries_use_indexes(self):
+        """Запросы представлений читают данные по индексам."""
+        call_command('check_query_plans', stdout=StringIO())
+
+    def test_query_plans_checked_on_repeated_runs(self):
+        """Повторный прогон проверяет запросы, а не кэш прошлого."""
+        self.client.get(reverse('posts:index'))
+        for _ in range(2):
+            out = StringIO()
+            call_command('check_query_plans', stdout=out)
+            self.assertNotIn(' 0 запросов', out.getvalue())
+
+    def test_post_detail_query_count(self):
+        """Автор и группа поста загружаются вместе с постом."""
+        post = Post.objects.filter(author=self.author).first()
+        with self.assertNumQueries(4):
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+
+
+class AuthorStatsTests(TestCase):
+    """Проверяем счётчики активности пользователя."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+
+    def setUp(self) -> None:
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_stats_follow_changes(self):
+        """Счётчики меняются при постах, комментариях и подписках."""
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новая запись'}
+        )
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Author'})
+        )
+        author_stats = get_author_stats(self.author.pk)
+        reader_stats = get_author_stats(self.reader.pk)
+        self.assertEqual(author_stats.posts_count, 2)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Author'})
+        )
+        self.post.delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_recount_command_fixes_drift(self):
+        """Команда recount исправляет расхождение счётчиков."""
+        get_author_stats(self.author.pk)
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=self.author)
+            for i in range(3)
+        )
+        self.assertEqual(get_author_stats(self.author.pk).posts_count, 1)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(get_author_stats(self.author.pk).posts_count, 4)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Author'})
+        )
+        self.assertContains(response, 'Всего постов: 4')
+
+
+class PostSearchTests(TestCase):
+    """Проверяем полнотекстовый поиск по постам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.relevant_post = Post.objects.create(
+            text='Котики котики и ещё раз котики',
+            author=cls.author,
+        )
+        cls.other_post = Post.objects.create(
+            text='Про собак и немного про котиков тоже: котики',
+            author=cls.author,
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Совсем другой текст {i}', author=cls.author)
+            for i in range(POSTS_ON_SEARCH_PAGE + 2)
+        )
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+
+    def test_search_ranks_matches(self):
+        """Поиск находит посты и ранжирует их по bm25."""
+        response = self.search('котики')
+        posts = list(response.context['page_obj'])
+        self.assertEqual(
+            [post.pk for post in posts],
+            [self.relevant_post.pk, self.other_post.pk],
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении постов."""
+        other_post = Post.objects.get(pk=self.other_post.pk)
+        other_post.text = 'Теперь здесь только собаки'
+        other_post.save()
+        Post.objects.get(pk=self.relevant_post.pk).delete()
+        self.assertEqual(len(self.search('котики').context['page_obj']), 0)
+        self.assertEqual(len(self.search('собаки').context['page_obj']), 1)
+
+    def test_search_paginates_and_keeps_query(self):
+        """Результаты поиска разбиты на страницы, ссылки хранят запрос."""
+        response = self.search('другой')
+        self.assertEqual(
+            len(response.context['page_obj']), POSTS_ON_SEARCH_PAGE
+        )
+        self.assertContains(
+            response, f'?{urlencode({"q": "другой"})}&amp;page=2'
+        )
+        response = self.search('другой', page=2)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_search_ignores_query_syntax(self):
+        """Служебные символы FTS5 в запросе не ломают поиск."""
+        for query in ('"котики', 'NEAR(', 'котики*:^', ''):
+            with self.subTest(query=query):
+                response = self.search(query)
+                self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.author,
+            group=cls.group,
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        cache.clear()
+
+    def test_unchanged_pages_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304 без рендера."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_changes_update_etag(self):
+        """Новые посты, комментарии и правки меняют ETag."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        changes = (
+            lambda: Comment.objects.create(
+                post=self.post, author=self.author, text='Комментарий'
+            ),
+            lambda: Post.objects.filter(pk=self.post.pk).first().save(),
+            lambda: Post.objects.create(text='Новый', author=self.author),
+        )
+        for change in changes:
+            etag = self.client.get(url)['ETag']
+            change()
+            with self.subTest(change=change):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_changes_without_dates_update_last_modified(self):
+        """Удаление комментария и подписка не дают устаревший 304.
+
+        Клиент, присылающий только If-Modified-Since, должен увидеть
+        изменения, у которых нет даты в таблицах.
+        """
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        later = timezone.now() + timedelta(minutes=1)
+        with mock.patch('posts.cache.timezone.now', return_value=later):
+            comment.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='Reader'))
+        url = reverse('posts:profile', kwargs={'username': 'Author'})
+        response = reader.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_cache_headers(self):
+        """Анонимам страницы кэшируются публично, пользователям — нет."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertNotEqual(
+            response['ETag'], self.client.get(url)['ETag']
+        )
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        cache.clear()
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторная страница для анонима отдаётся без запросов к базе."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_authorized_user_bypasses_cache(self):
+        """Страницы пользователей не кэшируются целиком."""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIn('page_obj', response.context)
+
+    def test_comment_invalidates_post_page(self):
+        """Новый комментарий сбрасывает кэш страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий'
+        )
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+
+    def test_page_cache_stats(self):
+        """Команда page_cache_stats считает попадания и промахи."""
+        url = reverse('posts:index')
+        for _ in range(3):
+            self.client.get(url)
+        out = StringIO()
+        call_command('page_cache_stats', '--reset', stdout=out)
+        self.assertIn('Всего запросов 3, доля попаданий 66.7%', out.getvalue())
+        out = StringIO()
+        call_command('page_cache_stats', stdout=out)
+        self.assertIn('Всего запросов 0', out.getvalue())
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='Author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовый текст',
+            slug='test-slug',
+        )
+        for i in range(3):
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=cls.author, group=cls.group
+            )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        cache.clear()
+
+    def get_group_page(self):
+        with mock.patch.object(
+            cards, 'render_to_string', wraps=cards.render_to_string
+        ) as render:
+            response = self.authorized_client.get(
+                reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+            )
+        return response, render.call_count
+
+    def test_only_changed_cards_rendered(self):
+        """Карточки берутся из кэша, кроме изменённых постов."""
+        self.assertEqual(self.get_group_page()[1], 3)
+        self.assertEqual(self.get_group_page()[1], 0)
+        post = Post.objects.filter(author=self.author).first()
+        post.text = 'Изменённый текст'
+        post.save()
+        response, rendered = self.get_group_page()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Изменённый текст')
+
+    def test_author_change_refreshes_cards(self):
+        """Изменение автора сбрасывает карточки его постов."""
+        self.get_group_page()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Алексей'
+        author.save()
+        response, rendered = self.get_group_page()
+        self.assertEqual(rendered, 3)
+        self.assertContains(response, 'Алексей Толстой')
+
+
+class PostCommentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Комментарий {i}')
+            for i in range(COMMENTS_ON_POST_PAGE + 5)
+        )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_page(self):
+        """На странице поста первая порция комментариев и их число."""
+        response = self.client.get(self.url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_ON_POST_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertEqual(
+            response.context['comments_count'], COMMENTS_ON_POST_PAGE + 5
+        )
+        self.assertContains(response, 'Показать ещё')
+
+    def test_comments_fragment_loads_next_page(self):
+        """Фрагмент по курсору отдаёт оставшиеся комментарии."""
+        first_page = self.client.get(self.url).context['comments']
+        response = self.client.get(
+            self.comments_url, {'cursor': first_page.next_cursor}
+        )
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertIsNone(response.context['comments'].next_page_number())
+        self.assertIsNone(response.context['comments'].start_index())
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertNotContains(response, '<html')
+        shown = {comment.pk for comment in first_page} | {
+            comment.pk for comment in response.context['comments']
+        }
+        self.assertEqual(len(shown), COMMENTS_ON_POST_PAGE + 5)
+
+    def test_comments_count_without_extra_query(self):
+        """Если все комментарии на странице, COUNT не выполняется."""
+        post = Post.objects.create(text='Другой пост', author=self.author)
+        Comment.objects.create(post=post, author=self.author, text='Один')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['comments_count'], 1)
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT COUNT(*)')
+            and '"posts_comment"."post_id"' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_comments_fragment_missing_post(self):
+        """Фрагмент комментариев несуществующего поста отдаёт 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,44 @@
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from .models import Post
+
+CONTENT_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+def image_variants() -> List[Tuple[int, str, Dict]]:
+    """Все варианты картинки поста: (ширина, геометрия, параметры sorl).
+
+    Высота каждой ширины считается из POST_IMAGE_SIZE, поэтому кадр
+    одинаков во всех вариантах и различается только разрешением.
+    """
+    width, height = settings.POST_IMAGE_SIZE
+    variants = []
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for variant_width in settings.POST_IMAGE_WIDTHS:
+            variant_height = round(height * variant_width / width)
+            variants.append((
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                {'crop': 'center', 'upscale': True, 'format': image_format},
+            ))
+    return variants
+
+
+def warm_post_thumbnails(post_id: int) -> None:
+    """Заранее создаёт все варианты картинки поста.
+
+    Ключи миниатюр совпадают с теми, что строит тег {% post_image %},
+    поэтому шаблоны находят готовый файл в хранилище ключей sorl
+    и не декодируют оригинал.
+    """
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return
+    for _, geometry, options in image_variants():
+        get_thumbnail(post.image, geometry, **options)
@@ -0,0 +1,155 @@
+from typing import Sequence
+
+from django.db import connection, transaction
+
+from .models import Follow, Post, TimelineEntry
+
+TIMELINE_BATCH_SIZE = 500
+
+
+def _bulk_insert(entries) -> int:
+    """Записывает элементы ленты пачками, пропуская уже существующие."""
+    inserted = 0
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+    return inserted
+
+
+def fan_out_post(post: Post) -> int:
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = (
+        Follow.objects
+        .filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    return _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_posts(posts) -> int:
+    """Раскладывает по лентам пачку постов, созданных без сигналов.
+
+    posts — тройки (id, author_id, pub_date). Подписчики всех авторов
+    пачки читаются одним запросом.
+    """
+    posts = list(posts)
+    followers = {}
+    for author_id, user_id in (
+        Follow.objects
+        .filter(author_id__in={author_id for _, author_id, _ in posts})
+        .values_list('author_id', 'user_id')
+        .iterator()
+    ):
+        followers.setdefault(author_id, []).append(user_id)
+    return _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, author_id, pub_date in posts
+        for user_id in followers.get(author_id, ())
+    )
+
+
+def backfill(user_id: int, author_id: int) -> int:
+    """Добавляет в ленту пользователя все посты автора."""
+    posts = (
+        Post.objects
+        .filter(author_id=author_id)
+        .values_list('id', 'pub_date')
+    )
+    return _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id: int, author_id: int) -> int:
+    """Убирает из ленты пользователя посты автора."""
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id,
+        author_id=author_id,
+    ).delete()
+    return deleted
+
+
+@transaction.atomic
+def rebuild(user_id: int) -> int:
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = (
+        Follow.objects
+        .filter(user_id=user_id)
+        .values_list('author_id', flat=True)
+    )
+    return sum(backfill(user_id, author_id) for author_id in authors)
+
+
+@transaction.atomic
+def rebuild_many(user_ids: Sequence[int]) -> int:
+    """Собирает заново ленты пользователей из списка.
+
+    Как rebuild_all, но только для этих пользователей: после загрузки,
+    которая добавила подписки и посты лишь им и их авторам, не нужно
+    переписывать остальные ленты.
+    """
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), TIMELINE_BATCH_SIZE):
+            chunk = list(user_ids[start:start + TIMELINE_BATCH_SIZE])
+            TimelineEntry.objects.filter(user_id__in=chunk).delete()
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                '(user_id, post_id, author_id, pub_date) '
+                'SELECT follow.user_id, post.id, post.author_id, '
+                'post.pub_date '
+                f'FROM {Follow._meta.db_table} follow '
+                f'JOIN {Post._meta.db_table} post '
+                'ON post.author_id = follow.author_id '
+                f'WHERE follow.user_id IN ({", ".join(["%s"] * len(chunk))})',
+                chunk,
+            )
+            inserted += cursor.rowcount
+    return inserted
+
+
+@transaction.atomic
+def rebuild_all() -> int:
+    """Собирает все ленты заново одним INSERT ... SELECT.
+
+    Нужна после загрузки данных в обход сигналов, когда пересборка
+    по пользователям заняла бы часы.
+    """
+    TimelineEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, author_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            'ON post.author_id = follow.author_id'
+        )
+        return cursor.rowcount
@@ -1,43 +1,73 @@
 from typing import Dict
 
 from django.core.paginator import Paginator
-from django.http import HttpResponse, HttpRequest
+from django.http import Http404, HttpResponse, HttpRequest
+from django.utils.http import urlencode
 from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 
+from core.jobs import enqueue
+
+from .cache import (
+    cache_anonymous_page, get_comments_version, get_feed_version,
+)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
+from .loaders import get_loader
+from .freshness import (
+    conditional_page, group_freshness, index_freshness, post_freshness,
+    profile_freshness,
+)
+from .models import Comment, Post, Follow, TimelineEntry
+from .paginators import CursorPaginator, paginate
+from .search import SearchResults
+from .stats import get_author_stats
+from .thumbnails import warm_post_thumbnails
 
 POSTS_ON_INDEX_PAGE = 10
 POSTS_ON_GROUP_POSTS_PAGE = 10
 POSTS_ON_PROFILE_PAGE = 10
-
-User = get_user_model()
+POSTS_ON_SEARCH_PAGE = 10
+COMMENTS_ON_POST_PAGE = 20
+CACHED_PAGES = ('index', 'group_posts', 'profile', 'post_detail')
+
+
+def comments_page(request: HttpRequest, post_id: int):
+    """Страница комментариев поста по курсору, от новых к старым."""
+    comments = (
+        Comment.objects
+        .filter(post_id=post_id)
+        .select_related('author')
+        .only('id', 'text', 'created', 'post_id', 'author__username')
+    )
+    paginator = CursorPaginator(
+        comments, COMMENTS_ON_POST_PAGE, key=('created', 'id')
+    )
+    return paginator.cursor_page(request.GET.get('cursor'))
 
 
+@cache_anonymous_page('index')
+@conditional_page(index_freshness)
 def index(request: HttpRequest) -> HttpResponse:
     """"Обработка запросов к главной странице."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_ON_INDEX_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = paginate(request, post_list, POSTS_ON_INDEX_PAGE)
     title: str = "Последние обновления на сайте"
     context: Dict = {
         'title': title,
         'page_obj': page_obj,
         'index': True,
+        'feed_version': get_feed_version(),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page('group_posts')
+@conditional_page(group_freshness)
 def group_posts(request: HttpRequest, slug) -> HttpResponse:
     """Обработка запросов к странице конкретного сообщества."""
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
-    paginator = Paginator(post_list, POSTS_ON_GROUP_POSTS_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = get_loader(request).group_or_404(slug)
+    post_list = Post.objects.for_feed().filter(group=group)
+    page_obj = paginate(request, post_list, POSTS_ON_GROUP_POSTS_PAGE)
     title: str = f'Записи сообщества {group.title}'
     context: Dict = {
         'title': title,
@@ -47,46 +77,73 @@ def group_posts(request: HttpRequest, slug) -> HttpResponse:
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page('profile')
+@conditional_page(profile_freshness)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
     """Отображение всех постов конкретного пользователя."""
-    if request.user.is_authenticated:
-        follow = User.objects.get(username=username)
-        following = (
-            Follow.objects
-            .filter(user=request.user, author=follow)
-            .exists()
-        )
-    else:
-        following = False
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    paginator = Paginator(post_list, POSTS_ON_PROFILE_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    loader = get_loader(request)
+    author = loader.user_or_404(username)
+    following = loader.is_following(author)
+    post_list = Post.objects.for_feed().filter(author=author)
+    page_obj = paginate(request, post_list, POSTS_ON_PROFILE_PAGE)
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'stats': get_author_stats(author.pk),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page('post_detail', get_comments_version)
+@conditional_page(post_freshness)
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
     """Отображение подробной информации по одному посту."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
     author = post.author
-    number_of_posts = Post.objects.filter(author=author).count()
-    comments = post.comments.all()
+    number_of_posts = get_author_stats(author.pk).posts_count
+    comments = comments_page(request, post.pk)
+    if comments.has_other_pages():
+        comments_count = post.comments.count()
+    else:
+        # Все комментарии уже на странице: отдельный COUNT не нужен.
+        comments_count = len(comments)
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'number_of_posts': number_of_posts,
         'comments': comments,
+        'comments_count': comments_count,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    """Следующая порция комментариев к посту для «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404('Пост не найден.')
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(request, post_id),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search(request: HttpRequest) -> HttpResponse:
+    """Полнотекстовый поиск по постам."""
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), POSTS_ON_SEARCH_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context: Dict = {
+        'title': f'Поиск: {query}' if query else 'Поиск',
+        'query': query,
+        'query_string': urlencode({'q': query}),
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request: HttpRequest) -> HttpResponse:
     """Создание нового поста."""
@@ -98,6 +155,8 @@ def post_create(request: HttpRequest) -> HttpResponse:
         new_post = form.save(commit=False)
         new_post.author = request.user
         form.save()
+        if new_post.image:
+            enqueue(warm_post_thumbnails, new_post.pk)
         return redirect(f'/profile/{request.user}/')
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -106,7 +165,7 @@ def post_create(request: HttpRequest) -> HttpResponse:
 def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
     """Редактирование существующего поста."""
     post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id=post_id)
 
     form = PostForm(
@@ -116,6 +175,8 @@ def post_edit(request: HttpRequest, post_id: int) -> HttpResponse:
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data and post.image:
+            enqueue(warm_post_thumbnails, post.pk)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -141,10 +202,22 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     """Страница с постами отслеживаемых людей."""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, POSTS_ON_INDEX_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    entries = (
+        TimelineEntry.objects
+        .filter(user=request.user)
+        .only('post_id', 'pub_date')
+    )
+    page_obj = paginate(
+        request, entries, POSTS_ON_INDEX_PAGE, key=('pub_date', 'post_id')
+    )
+    posts = Post.objects.for_feed().in_bulk(
+        [entry.post_id for entry in page_obj.object_list]
+    )
+    # Пост мог быть удалён между чтением ленты и выборкой постов.
+    page_obj.object_list = [
+        posts[entry.post_id] for entry in page_obj.object_list
+        if entry.post_id in posts
+    ]
     title: str = "Последние обновления на сайте"
     context: Dict = {
         'title': title,
@@ -156,7 +229,7 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    follow = get_object_or_404(User, username=username)
+    follow = get_loader(request).user_or_404(username)
     if follow != request.user:
         Follow.objects.get_or_create(
             user=request.user,
@@ -167,12 +240,6 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    follow = get_object_or_404(User, username=username)
-    is_exist = (
-        Follow.objects
-        .filter(user=request.user, author=follow)
-        .exists()
-    )
-    if is_exist:
-        Follow.objects.filter(user=request.user, author=follow).delete()
+    follow = get_loader(request).user_or_404(username)
+    Follow.objects.filter(user=request.user, author=follow).delete()
     return redirect('posts:profile', username=username)
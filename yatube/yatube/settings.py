@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,6 +17,8 @@ SECRET_KEY = '^cw725nq!g1=mr@ar2n!o1vi2za1n__i4t8!bn=jgu7q!y^7!('
 
 DEBUG = True
 
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = ['testserver',
                  '127.0.0.1',
                  'www.valysha.pythonanywhere.com',
@@ -39,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.RequestTimingMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,12 +85,47 @@ DATABASES = {
     }
 }
 
+# Кэш в общем файле SQLite: все воркеры на машине видят одни и те же
+# фрагменты, страницы и версии. Тесты работают с кэшем в памяти, чтобы
+# не зависеть от записей, оставшихся от других запусков.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько секунд хранить страницы лент и постов для анонимов.
+# Устаревшие страницы отсекаются версиями, таймаут лишь ограничивает
+# память; 0 отключает кэш страниц.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Сколько секунд ждать, пока другой воркер рендерит ту же страницу.
+POSTS_PAGE_LOCK_TIMEOUT = 5
+
+# Карточки постов в лентах. Ключ меняется вместе с постом, поэтому
+# таймаут нужен только для вытеснения давно не показанных карточек.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Тег {% swrcache %}: устаревший фрагмент обновляется в фоне, пока
+# запросы получают старую версию. Мягкий срок каждого фрагмента
+# случайно сокращается на долю до SWRCACHE_JITTER.
+SWRCACHE_BACKGROUND = True
+
+SWRCACHE_JITTER = 0.1
+
+SWRCACHE_REFRESH_LEASE = 30
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -129,3 +169,92 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+# Хранилище ключей sorl.thumbnail: LRU в памяти процесса поверх
+# общего для воркеров файла SQLite.
+THUMBNAIL_KVSTORE = 'core.thumbnail_kvstore.KVStore'
+
+THUMBNAIL_KVSTORE_PATH = os.path.join(BASE_DIR, 'thumbnail_kvstore.sqlite3')
+
+THUMBNAIL_KVSTORE_LRU_SIZE = 10000
+
+THUMBNAIL_KVSTORE_WARM_ON_STARTUP = True
+
+# Тесты очищают хранилище ключей миниатюр, поэтому работают с базой
+# SQLite в памяти, а не с общим файлом разработчика или сервера.
+if TESTING:
+    THUMBNAIL_KVSTORE_PATH = ':memory:'
+
+# Замеры запросов (core.timing): доля запросов, для которых считаются
+# SQL, шаблоны, кэш и миниатюры. Результат уходит в заголовок
+# Server-Timing и строкой JSON в логгер core.timing.
+REQUEST_TIMING_SAMPLE_RATE = 0.05
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.nplusone': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Поиск N+1 (core.nplusone): запрос одной формы, выполненный за
+# HTTP-запрос NPLUSONE_THRESHOLD раз и больше, считается N+1. В тестах
+# это ошибка, в продакшене — предупреждение в логгере core.nplusone.
+NPLUSONE_THRESHOLD = 3
+
+NPLUSONE_RAISE = False
+
+if TESTING:
+    REQUEST_TIMING_SAMPLE_RATE = 0
+    NPLUSONE_RAISE = True
+
+# Фоновые задачи (core.jobs)
+BACKGROUND_JOBS_WORKERS = 2
+
+BACKGROUND_JOBS_EAGER = False
+
+# Картинки постов: кадр 960x339, который выдаётся в нескольких
+# ширинах (srcset) в WebP и запасном JPEG. Все варианты создаются
+# через sorl.thumbnail и хранятся на диске после первого обращения.
+POST_IMAGE_SIZE = (960, 339)
+
+POST_IMAGE_WIDTHS = (320, 640, 960)
+
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+# Загрузка картинок постов. Файлы всегда пишутся во временный каталог
+# на диске, размеры проверяются по заголовку, а оригиналы больше
+# POST_IMAGE_MAX_DIMENSIONS уменьшаются и сохраняются без EXIF.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 50_000_000
+
+# PNG, WebP и GIF нельзя декодировать с уменьшением, как JPEG: они
+# распаковываются целиком, и пик памяти при уменьшении — около 8 байт
+# на пиксель оригинала (~130 МБ на 16 Мп), поэтому их лимит ниже.
+POST_IMAGE_MAX_PIXELS_FULL_DECODE = 16_000_000
+
+POST_IMAGE_MAX_DIMENSIONS = (2560, 2560)
+
+POST_IMAGE_QUALITY = 85
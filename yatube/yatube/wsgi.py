@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.THUMBNAIL_KVSTORE_WARM_ON_STARTUP:
+    from core.thumbnail_kvstore import warm_thumbnail_kvstore
+
+    warm_thumbnail_kvstore()